@@ -0,0 +1,79 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .circuitIO import circuit_from_json, circuit_to_json
+from .pipeline import circuit_cost, optimize
+
+
+def _optimize_one(circuit, passes, max_rounds):
+    ops_before = circuit_cost(circuit)[0]
+    opt = optimize(circuit, passes, max_rounds).circuit
+    return opt, ops_before, circuit_cost(opt)[0]
+
+
+def _optimize_chunk(texts, passes, max_rounds):
+    # runs in a worker process: circuits travel as compact JSON both ways
+    results = []
+    for text in texts:
+        opt, ops_before, ops_after = _optimize_one(circuit_from_json(text), passes, max_rounds)
+        results.append((circuit_to_json(opt), ops_before, ops_after))
+    return results
+
+
+def optimize_many(circuits, passes='fbcd', workers=None, chunksize=16, max_rounds=10, stats=None):
+    """
+    Optimize many circuits over a pool of processes. Circuits are sent to the workers in chunks, at most two chunks
+    per worker are in flight, and the optimized circuits are yielded in input order as soon as they are ready
+    :param circuits: iterable of circuits, it may be a generator
+    :param passes: characters of the templates given to pipeline.optimize
+    :param workers: number of processes, all cores by default. With 1 the circuits are optimized in this process
+    :param chunksize: number of circuits sent to a worker at once
+    :param max_rounds: maximum number of rounds given to pipeline.optimize
+    :param stats: optional dictionary updated after each circuit with the keys circuits, ops_before, ops_after,
+    seconds and circuits_per_second
+    :return: generator of optimized circuits
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if stats is None:
+        stats = {}
+    stats.update(circuits=0, ops_before=0, ops_after=0, seconds=0.0, circuits_per_second=0.0)
+    start = time.perf_counter()
+
+    def record(ops_before, ops_after):
+        stats['circuits'] += 1
+        stats['ops_before'] += ops_before
+        stats['ops_after'] += ops_after
+        stats['seconds'] = time.perf_counter() - start
+        if stats['seconds'] > 0:
+            stats['circuits_per_second'] = stats['circuits'] / stats['seconds']
+
+    if workers == 1:
+        for circuit in circuits:
+            opt, ops_before, ops_after = _optimize_one(circuit, passes, max_rounds)
+            record(ops_before, ops_after)
+            yield opt
+        return
+
+    circuits = iter(circuits)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+
+        def submit_next():
+            chunk = [circuit_to_json(circuit) for circuit in islice(circuits, chunksize)]
+            if chunk:
+                in_flight.append(executor.submit(_optimize_chunk, chunk, passes, max_rounds))
+            return bool(chunk)
+
+        for _ in range(2 * workers):
+            if not submit_next():
+                break
+        while in_flight:
+            results = in_flight.popleft().result()
+            submit_next()
+            for text, ops_before, ops_after in results:
+                record(ops_before, ops_after)
+                yield circuit_from_json(text)
@@ -0,0 +1,141 @@
+import functools
+
+import numpy as np
+from cirq import has_unitary, unitary
+
+
+# largest number of amplitudes held at once, the pairs are simulated in chunks below it
+MAX_AMPLITUDES = 2 ** 20
+
+
+@functools.lru_cache(maxsize=None)
+def _sparse_rows(gate):
+    # the unitary of the gate as, for each row, its nonzero columns and values, padded to the same number of terms.
+    # Permutations such as X, CNOT, SWAP and the CXn fan-outs and diagonal gates have one term per row, H two
+    if not has_unitary(gate):
+        raise ValueError(f"{gate} has no unitary")
+    matrix = unitary(gate)
+    nonzero = np.abs(matrix) > 1e-12
+    terms = int(nonzero.sum(axis=1).max())
+    columns = np.tile(np.arange(len(matrix))[:, None], (1, terms))
+    values = np.zeros((len(matrix), terms), dtype=np.complex128)
+    for row in range(len(matrix)):
+        cols = np.flatnonzero(nonzero[row])
+        columns[row, :len(cols)] = cols
+        values[row, :len(cols)] = matrix[row, cols]
+    return columns, values
+
+
+@functools.lru_cache(maxsize=None)
+def _gather_table(gate, axes, width):
+    # the gate on the qubits at the axes of a state of width qubits, the first qubit being the most significant bit:
+    # new_state[i] = sum over j of coefficients[i, j] * state[sources[i, j]]
+    columns, values = _sparse_rows(gate)
+    k = len(axes)
+    index = np.arange(2 ** width)
+    shifts = [width - 1 - axis for axis in axes]
+    # row of the gate unitary used by each amplitude, and the amplitude index without the bits of the gate qubits
+    row = np.zeros_like(index)
+    base = index.copy()
+    for m, shift in enumerate(shifts):
+        bit = (index >> shift) & 1
+        row |= bit << (k - 1 - m)
+        base &= ~(1 << shift)
+    sources = np.broadcast_to(base[:, None], (len(index), columns.shape[1])).copy()
+    for m, shift in enumerate(shifts):
+        sources |= ((columns[row] >> (k - 1 - m)) & 1) << shift
+    return sources, values[row]
+
+
+def _encode(circuits, width):
+    # per number of terms, the gather tables stacked, and per circuit and step the number of terms (0 once the circuit
+    # has ended) and the index of the table
+    tables = {}
+    ids = {}
+    encoded = []
+    for circuit, index in circuits:
+        steps = []
+        for op in circuit.all_operations():
+            key = (op.gate, tuple(map(index.__getitem__, op.qubits)))
+            step = ids.get(key)
+            if step is None:
+                sources, coefficients = _gather_table(key[0], key[1], width)
+                group = tables.setdefault(sources.shape[1], ([], []))
+                step = ids[key] = (sources.shape[1], len(group[0]))
+                group[0].append(sources)
+                group[1].append(coefficients)
+            steps.append(step)
+        encoded.append(steps)
+    length = max((len(steps) for steps in encoded), default=0)
+    terms = np.zeros((len(encoded), length), dtype=np.int64)
+    table = np.zeros((len(encoded), length), dtype=np.int64)
+    for entry, steps in enumerate(encoded):
+        if steps:
+            terms[entry, :len(steps)], table[entry, :len(steps)] = zip(*steps)
+    tables = {r: (np.stack(sources), np.stack(coefficients)) for r, (sources, coefficients) in tables.items()}
+    return tables, terms, table
+
+
+def _simulate(tables, terms, table, states):
+    # states has shape (entries, num_states, 2^width). At each step the operations of all the circuits are applied
+    # together, in one gather and product per number of terms
+    for t in range(terms.shape[1]):
+        for r in np.unique(terms[:, t]):
+            if r == 0:
+                continue
+            entries = np.flatnonzero(terms[:, t] == r)
+            sources, coefficients = tables[r]
+            sources = sources[table[entries, t]]
+            # gathered[g, i, j, s] = states[entries[g], s, sources[g, i, j]]
+            gathered = states[entries[:, None, None], :, sources]
+            states[entries] = np.einsum('gij,gijs->gsi', coefficients[table[entries, t]], gathered)
+    return states
+
+
+def batch_fidelities(pairs, num_states=4, seed=None):
+    """
+    Compare many pairs of circuits in a few NumPy computations instead of one simulation per circuit. Both circuits of
+    a pair run on the same random input states, and pairs of the same width are simulated together
+    :param pairs: list of tuples (origin circuit, optimized circuit)
+    :param num_states: number of random input states per pair
+    :param seed: seed or numpy.random.Generator of the input states
+    :return: array with the fidelity of each pair, |mean over the states of <origin state|optimized state>|^2. It is 1
+    when the circuits are equal up to global phase, and below 1 when they differ, also by a relative phase between
+    input states
+    """
+    rng = np.random.default_rng(seed)
+    fidelities = np.zeros(len(pairs))
+    by_width = {}
+    orders = []
+    for i, (origin, opt) in enumerate(pairs):
+        qubits = sorted(origin.all_qubits() | opt.all_qubits())
+        orders.append(qubits)
+        by_width.setdefault(len(qubits), []).append(i)
+
+    for width, indices in by_width.items():
+        dim = 2 ** width
+        chunk = max(1, MAX_AMPLITUDES // (2 * num_states * dim))
+        for start in range(0, len(indices), chunk):
+            batch = indices[start:start + chunk]
+            circuits = []
+            for i in batch:
+                index = {qubit: axis for axis, qubit in enumerate(orders[i])}
+                circuits.append((pairs[i][0], index))
+                circuits.append((pairs[i][1], index))
+            shape = (len(batch), num_states, dim)
+            states = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+            states /= np.linalg.norm(states, axis=-1, keepdims=True)
+            # entries 2i and 2i + 1 are the origin and optimized circuits of the i-th pair of the batch
+            states = _simulate(*_encode(circuits, width), np.repeat(states, 2, axis=0))
+            states = states.reshape(len(batch), 2, num_states, dim)
+            overlaps = np.einsum('bsi,bsi->bs', states[:, 0].conj(), states[:, 1])
+            fidelities[batch] = np.abs(overlaps.mean(axis=1)) ** 2
+    return fidelities
+
+
+def batch_equivalent(pairs, num_states=4, atol=1e-6, seed=None):
+    """
+    :param pairs: list of tuples (origin circuit, optimized circuit)
+    :return: boolean array, True for the pairs equal up to global phase
+    """
+    return batch_fidelities(pairs, num_states, seed) > 1 - atol
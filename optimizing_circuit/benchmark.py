@@ -0,0 +1,245 @@
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from cirq import LineQubit
+
+from .circuitDag import apply_templates
+from .pipeline import circuit_cost
+from .randomCircuit import generate_random_circuit
+from .transformer import TRANSFORMERS
+
+
+# smallest number of qubits and depth generate_random_circuit can build for each template
+TEMPLATE_MIN_QUBITS = {'a': 4, 'b': 2, 'c': 2, 'd': 3, 'e': 2, 'f': 2}
+TEMPLATE_MIN_DEPTH = {'a': 9, 'b': 2, 'c': 2, 'd': 2, 'e': 1, 'f': 5}
+
+ENGINES = {
+    # the transformer of the template in transformer.py
+    'transformer': lambda circuit, template: TRANSFORMERS[template](circuit),
+    # the same template applied by the DAG engine
+    'dag': lambda circuit, template: apply_templates(circuit, template),
+}
+
+# modules whose import time is measured by --import-time: the command line tool, the optimizer it loads for the
+# first circuit, and the verification helpers
+IMPORT_MODULES = ['cli', 'instrumentation', 'pipeline', 'transformer', 'circuitDag', 'circuitIO', 'testing']
+
+FIELDS = ['engine', 'template', 'qubits', 'depth', 'seed', 'ops_before', 'ops_after', 'depth_before',
+          'depth_after', 'seconds', 'gates_per_second', 'peak_kib', 'error']
+
+
+def benchmark_point(engine, template, num_qubits, depth, seed=0, memory=True, repeat=3):
+    """
+    Time one engine on a seeded random circuit containing the template
+    :param engine: 'transformer' or 'dag'
+    :param template: a character to point the template
+    :param num_qubits: number of qubits of the circuit
+    :param depth: number of gates of the circuit
+    :param seed: seed of the random circuit
+    :param memory: also measure the peak memory, in a second traced run
+    :param repeat: number of timed runs, the fastest one is reported
+    :return: dictionary with the keys of FIELDS
+    """
+    random.seed(seed)
+    circuit = generate_random_circuit([LineQubit(i) for i in range(num_qubits)], depth, template)
+    ops_before, depth_before = circuit_cost(circuit)
+    result = {'engine': engine, 'template': template, 'qubits': num_qubits, 'depth': depth, 'seed': seed,
+              'ops_before': ops_before, 'depth_before': depth_before, 'ops_after': None, 'depth_after': None,
+              'seconds': None, 'gates_per_second': None, 'peak_kib': None, 'error': None}
+    try:
+        seconds = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            opt = ENGINES[engine](circuit, template)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        if memory:
+            tracemalloc.start()
+            try:
+                ENGINES[engine](circuit, template)
+                result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+            finally:
+                tracemalloc.stop()
+    except Exception as error:
+        result['error'] = f"{type(error).__name__}: {error}"
+        return result
+
+    result['ops_after'], result['depth_after'] = circuit_cost(opt)
+    result['seconds'] = seconds
+    result['gates_per_second'] = ops_before / seconds if seconds > 0 else None
+    return result
+
+
+def run_benchmark(qubits=(4, 16, 64), depths=(10, 100, 1000), templates='abcdef', engines=('transformer', 'dag'),
+                  seed=0, memory=True, repeat=3):
+    """
+    Benchmark every engine over the grid of qubit counts, depths and templates. Grid points which are too small for
+    a template are skipped
+    :return: list of dictionaries with the keys of FIELDS
+    """
+    results = []
+    for template in templates:
+        for num_qubits in qubits:
+            for depth in depths:
+                if num_qubits < TEMPLATE_MIN_QUBITS[template] or depth < TEMPLATE_MIN_DEPTH[template]:
+                    continue
+                for engine in engines:
+                    results.append(benchmark_point(engine, template, num_qubits, depth, seed, memory, repeat))
+    return results
+
+
+def scaling_exponent(results):
+    """
+    Fit seconds ~ gates^k on results of one engine and template over several depths. k close to 1 means the pass
+    scales linearly, close to 2 quadratically
+    :param results: results with the same engine and template, and at least two different depths
+    :return: the exponent k, or None when fewer than two points ran without error
+    """
+    points = [(math.log(result['ops_before']), math.log(result['seconds'])) for result in results
+              if not result['error'] and result['seconds']]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def import_times(modules=IMPORT_MODULES, repeat=3):
+    """
+    Time the import of each module in a new interpreter, as a worker process or a short run of the command line tool
+    pays it
+    :param modules: names of the modules
+    :param repeat: number of interpreters per module, the fastest one is reported
+    :return: dictionary from module name to seconds
+    """
+    code = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+    # run from the directory holding the package, so the modules are imported from this tree
+    directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = {}
+    for module in modules:
+        command = [sys.executable, '-c', code.format(f'{__package__}.{module}')]
+        runs = [float(subprocess.run(command, cwd=directory, check=True, capture_output=True, text=True).stdout)
+                for _ in range(repeat)]
+        times[module] = min(runs)
+    return times
+
+
+def _key(result):
+    return result['engine'], result['template'], result['qubits'], result['depth'], result['seed']
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Find the grid points which got slower or reduce fewer gates than in the baseline
+    :param results: results of run_benchmark
+    :param baseline: results of an earlier run
+    :param tolerance: relative drop of gates per second accepted before reporting a regression
+    :return: list of messages, one per regression
+    """
+    previous = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        name = "{} template {} on {} qubits, depth {}".format(*_key(result))
+        if result['error'] and not old['error']:
+            regressions.append(f"{name}: fails with {result['error']}")
+            continue
+        if result['gates_per_second'] and old['gates_per_second'] \
+                and result['gates_per_second'] < (1 - tolerance) * old['gates_per_second']:
+            regressions.append(f"{name}: {result['gates_per_second']:.0f} gates/s, "
+                               f"baseline {old['gates_per_second']:.0f} gates/s")
+        if result['ops_after'] is not None and old['ops_after'] is not None \
+                and result['ops_after'] > old['ops_after']:
+            regressions.append(f"{name}: {result['ops_after']} gates left, baseline {old['ops_after']}")
+    return regressions
+
+
+def write_json(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load_json(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_csv(results, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the template transformers on random circuits")
+    parser.add_argument('--qubits', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--depths', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--templates', default='abcdef')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=['transformer', 'dag'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per grid point, the fastest is kept")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced run measuring peak memory")
+    parser.add_argument('--json', help="write the results to this JSON file")
+    parser.add_argument('--csv', help="write the results to this CSV file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--scaling', action='store_true',
+                        help="also print how the time of each engine and template grows with the depth")
+    parser.add_argument('--import-time', nargs='*', metavar='MODULE',
+                        help="only time the import of these modules in new interpreters, by default "
+                             + ", ".join(IMPORT_MODULES))
+    args = parser.parse_args(argv)
+
+    if args.import_time is not None:
+        for module, seconds in import_times(args.import_time or IMPORT_MODULES, args.repeat).items():
+            print(f"{module:>15} {seconds * 1000:>8.1f} ms")
+        return 0
+
+    results = run_benchmark(args.qubits, args.depths, args.templates, args.engines, args.seed, not args.no_memory,
+                            args.repeat)
+    for result in results:
+        if result['error']:
+            print(f"{result['engine']:>11} {result['template']} {result['qubits']:>4} qubits {result['depth']:>7} "
+                  f"gates  {result['error']}")
+        else:
+            print(f"{result['engine']:>11} {result['template']} {result['qubits']:>4} qubits {result['depth']:>7} "
+                  f"gates  {result['gates_per_second']:>10.0f} gates/s  "
+                  f"{result['ops_before']} -> {result['ops_after']} gates  "
+                  f"{result['depth_before']} -> {result['depth_after']} depth")
+    if args.scaling:
+        groups = {}
+        for result in results:
+            groups.setdefault((result['engine'], result['template'], result['qubits']), []).append(result)
+        for (engine, template, num_qubits), group in groups.items():
+            exponent = scaling_exponent(group)
+            if exponent is not None:
+                print(f"{engine:>11} {template} {num_qubits:>4} qubits  time ~ gates^{exponent:.2f}")
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.baseline:
+        regressions = compare_to_baseline(results, load_json(args.baseline), args.tolerance)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
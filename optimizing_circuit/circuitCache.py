@@ -0,0 +1,138 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+from cirq import LineQubit
+
+from .circuitIO import circuit_from_json, circuit_to_json
+
+
+def _canonical_text(circuit):
+    # one line per operation: the gate and the indices of its qubits in order of first use
+    index = {}
+    lines = []
+    for op in circuit.all_operations():
+        for qubit in op.qubits:
+            if qubit not in index:
+                index[qubit] = len(index)
+        if op.gate is None:
+            # an operation without a gate, such as a CircuitOperation, is written whole on the canonical qubits
+            lines.append(repr(op.transform_qubits(lambda qubit: LineQubit(index[qubit]))))
+        else:
+            lines.append(f"{op.gate!r} {' '.join(str(index[qubit]) for qubit in op.qubits)}")
+    return '\n'.join(lines), list(index)
+
+
+def canonical_form(circuit):
+    """
+    Relabel the qubits of a circuit in order of first use, so that circuits which only differ by their qubit labels
+    get the same form
+    :param circuit: a circuit
+    :return: tuple (hash of the canonical form, qubits of the circuit in order of first use)
+    """
+    text, qubits = _canonical_text(circuit)
+    return hashlib.sha256(text.encode()).hexdigest(), qubits
+
+
+def _optimizer_name(optimizer):
+    # module and qualified name of a function defined at the top of a module or in a class. Lambdas, local functions
+    # and partial objects have no name telling them apart, and bound methods share theirs between instances
+    module = getattr(optimizer, '__module__', None)
+    qualname = getattr(optimizer, '__qualname__', None)
+    if module is None or qualname is None or '<' in qualname or hasattr(optimizer, '__self__'):
+        raise ValueError(f"Give a name for the optimizer {optimizer!r}, it has no name identifying it")
+    return f"{module}.{qualname}"
+
+
+class OptimizationCache:
+    """
+    LRU cache of optimized circuits keyed by the canonical form of the input circuit and the optimizer, with an
+    optional SQLite store on disk shared between runs
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, path=None):
+        """
+        :param max_entries: maximum number of circuits kept in memory
+        :param max_bytes: maximum total size of the circuits kept in memory, measured on their canonical text
+        :param path: SQLite file of the disk store, None to keep the cache in memory only
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (optimized circuit on LineQubit(i) for the i-th canonical qubit, size in bytes)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS circuits (key TEXT PRIMARY KEY, circuit TEXT NOT NULL)")
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.bytes}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def optimize(self, circuit, optimizer, name=None):
+        """
+        Return the optimized circuit from the cache, or optimize and store it
+        :param circuit: a circuit to optimize
+        :param optimizer: function taking a circuit and returning the optimized circuit
+        :param name: name of the optimizer in the keys, its module and qualified name by default. Give a different
+        name when the same function is called with different settings. It is required for lambdas, local functions,
+        bound methods and functools.partial objects, which raise ValueError without it
+        :return: the optimized circuit on the qubits of the given circuit
+        """
+        if name is None:
+            name = _optimizer_name(optimizer)
+        key, qubits = canonical_form(circuit)
+        key = f"{name}:{key}"
+        canonical = [LineQubit(i) for i in range(len(qubits))]
+
+        opt = self._get(key)
+        if opt is None:
+            self.misses += 1
+            # optimize the relabeled circuit so that the stored result does not depend on the labels
+            relabeled = circuit.transform_qubits(dict(zip(qubits, canonical)))
+            opt = optimizer(relabeled)
+            self._put(key, opt)
+        return opt.transform_qubits(dict(zip(canonical, qubits)))
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.db is not None:
+            row = self.db.execute("SELECT circuit FROM circuits WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                opt = circuit_from_json(row[0])
+                self._remember(key, opt)
+                return opt
+        return None
+
+    def _put(self, key, opt):
+        if self.db is not None:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO circuits (key, circuit) VALUES (?, ?)",
+                                (key, circuit_to_json(opt)))
+        self._remember(key, opt)
+
+    def _remember(self, key, opt):
+        size = len(_canonical_text(opt)[0])
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (opt, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
@@ -0,0 +1,351 @@
+from collections import deque
+
+from cirq import Circuit, CNOT, H
+
+from .customGate import CXX, fan_out
+from .instrumentation import instrumented
+
+
+class DagNode:
+    """
+    An operation of the circuit linked to its predecessor and successor on every qubit it acts on
+    """
+    __slots__ = ('op', 'seq', 'prev', 'next', 'alive', 'expanded')
+
+    def __init__(self, op, seq):
+        self.op = op
+        # sorting the live nodes by seq always gives a valid order of the circuit
+        self.seq = seq
+        self.prev = {qubit: None for qubit in op.qubits}
+        self.next = {qubit: None for qubit in op.qubits}
+        self.alive = True
+        # nodes created by a rewrite are never flipped again by template e
+        self.expanded = False
+
+
+class CircuitDag:
+    """
+    Gate-dependency DAG of a circuit: per-qubit predecessor/successor links between operations
+    """
+
+    def __init__(self, circuit):
+        self.nodes = []
+        # first and last live node on each qubit
+        self.first = {}
+        self.last = {}
+        # optional check (old operations, new operations) -> bool deciding whether a rewrite of a template is applied
+        self.accept = None
+        # number of seqs handed out by seqs_after
+        self.num_placed = 0
+        for op in circuit.all_operations():
+            node = DagNode(op, (len(self.nodes),))
+            for qubit in op.qubits:
+                prev = self.last.get(qubit)
+                node.prev[qubit] = prev
+                if prev is not None:
+                    prev.next[qubit] = node
+                else:
+                    self.first[qubit] = node
+                self.last[qubit] = node
+            self.nodes.append(node)
+
+    def seqs_after(self, seq, count):
+        """
+        Seqs for new nodes placed right after a node. Each call takes lower last elements than all the calls before, so
+        the new seqs come before every seq placed after the same node so far, and nothing can sort between them and
+        the node
+        :param seq: seq of the node
+        :param count: number of seqs
+        :return: list of increasing seqs
+        """
+        self.num_placed += count
+        return [seq + (i - self.num_placed,) for i in range(count)]
+
+    def can_replace(self, nodes, slot):
+        """
+        Check that the nodes can be gathered at the position slot without crossing any other operation on their qubits
+        :param nodes: nodes to replace, consecutive on each qubit they act on
+        :param slot: seq of one of the nodes where the replacement is placed
+        :return: True if the replacement keeps the order of the circuit
+        """
+        inside = set(nodes)
+        for node in nodes:
+            for qubit in node.op.qubits:
+                prev = node.prev[qubit]
+                if prev is not None and prev not in inside and prev.seq > slot:
+                    return False
+                nxt = node.next[qubit]
+                if nxt is not None and nxt not in inside and nxt.seq < slot:
+                    return False
+        return True
+
+    def replace(self, nodes, new_ops, slot):
+        """
+        Remove the nodes and link the new operations in their place
+        :param nodes: nodes to remove, consecutive on each qubit they act on
+        :param new_ops: operations to insert, acting only on qubits of the removed nodes
+        :param slot: seq of one of the removed nodes where the new operations are placed
+        :return: the new nodes and their neighbours, which may now match a template
+        """
+        inside = set(nodes)
+        before = {}
+        after = {}
+        for node in nodes:
+            node.alive = False
+            for qubit in node.op.qubits:
+                if node.prev[qubit] not in inside:
+                    before[qubit] = node.prev[qubit]
+                if node.next[qubit] not in inside:
+                    after[qubit] = node.next[qubit]
+
+        last = dict(before)
+        created = []
+        for op, seq in zip(new_ops, self.seqs_after(slot, len(new_ops))):
+            new_node = DagNode(op, seq)
+            new_node.expanded = True
+            for qubit in op.qubits:
+                prev = last[qubit]
+                new_node.prev[qubit] = prev
+                if prev is not None:
+                    prev.next[qubit] = new_node
+                last[qubit] = new_node
+            created.append(new_node)
+            self.nodes.append(new_node)
+
+        for qubit, nxt in after.items():
+            tail = last[qubit]
+            if tail is not None:
+                tail.next[qubit] = nxt
+            if nxt is not None:
+                nxt.prev[qubit] = tail
+            else:
+                self._set_end(self.last, qubit, tail)
+            if before[qubit] is None:
+                head = nxt
+                for new_node in created:
+                    if qubit in new_node.prev:
+                        head = new_node
+                        break
+                self._set_end(self.first, qubit, head)
+
+        touched = [node for node in before.values() if node is not None]
+        touched.extend(created)
+        touched.extend(node for node in after.values() if node is not None)
+        return touched
+
+    def rewrite(self, nodes, new_ops, slot):
+        """
+        Replace the nodes like replace, unless the accept check rejects the rewrite
+        :return: the touched nodes as replace, or None when the rewrite is rejected
+        """
+        if self.accept is not None and not self.accept([node.op for node in nodes], new_ops):
+            return None
+        return self.replace(nodes, new_ops, slot)
+
+    def insert(self, op, seq, hint=None):
+        """
+        Link a new operation at the position seq of the order of the circuit
+        :param op: operation to insert
+        :param seq: seq of the new node, different from the seq of every live node
+        :param hint: live node placed before seq, the search of the neighbours on its qubits starts from it
+        :return: the new node
+        """
+        node = DagNode(op, seq)
+        for qubit in op.qubits:
+            prev = hint if hint is not None and qubit in hint.prev else self.last.get(qubit)
+            # walk to the last node on the qubit placed before seq
+            while prev is not None and prev.seq > seq:
+                prev = prev.prev[qubit]
+            while prev is not None and prev.next[qubit] is not None and prev.next[qubit].seq < seq:
+                prev = prev.next[qubit]
+            nxt = self.first.get(qubit) if prev is None else prev.next[qubit]
+            node.prev[qubit] = prev
+            node.next[qubit] = nxt
+            if prev is not None:
+                prev.next[qubit] = node
+            else:
+                self.first[qubit] = node
+            if nxt is not None:
+                nxt.prev[qubit] = node
+            else:
+                self.last[qubit] = node
+        self.nodes.append(node)
+        return node
+
+    @staticmethod
+    def _set_end(ends, qubit, node):
+        if node is None:
+            ends.pop(qubit, None)
+        else:
+            ends[qubit] = node
+
+    def to_circuit(self):
+        live = [node for node in self.nodes if node.alive]
+        live.sort(key=lambda node: node.seq)
+        return Circuit([node.op for node in live])
+
+
+def _is_h(node):
+    return node is not None and node.op.gate == H
+
+
+def _is_cnot(node):
+    return node is not None and node.op.gate == CNOT
+
+
+def _is_sandwiched_cnot(node, target):
+    # a CNOT on the target whose control qubit has a H gate right before and right after it
+    if not _is_cnot(node) or node.op.qubits[1] != target:
+        return False
+    control = node.op.qubits[0]
+    return _is_h(node.prev[control]) and _is_h(node.next[control])
+
+
+def _merge_flip_cnot(dag, node):
+    # template a: k >= 2 CNOTs sharing a target, each control sandwiched by H gates, become one fan-out gate
+    if not _is_cnot(node):
+        return None
+    target = node.op.qubits[1]
+    if not _is_sandwiched_cnot(node, target):
+        return None
+
+    # the node may be anywhere in the run of CNOTs with distinct controls on the target
+    run = [node]
+    controls = {node.op.qubits[0]}
+    while _is_sandwiched_cnot(run[0].prev[target], target) and run[0].prev[target].op.qubits[0] not in controls:
+        run.insert(0, run[0].prev[target])
+        controls.add(run[0].op.qubits[0])
+    while _is_sandwiched_cnot(run[-1].next[target], target) and run[-1].next[target].op.qubits[0] not in controls:
+        run.append(run[-1].next[target])
+        controls.add(run[-1].op.qubits[0])
+
+    # the largest window that can be gathered wins
+    for size in range(len(run), 1, -1):
+        for start in range(len(run) - size + 1):
+            window = run[start:start + size]
+            controls = [cnot.op.qubits[0] for cnot in window]
+            nodes = list(window)
+            for cnot, control in zip(window, controls):
+                nodes.extend([cnot.prev[control], cnot.next[control]])
+            if dag.can_replace(nodes, window[0].seq):
+                return dag.rewrite(nodes, [H(target), fan_out(size).on(target, *controls), H(target)], window[0].seq)
+    return None
+
+
+def _cancel_adj_h(dag, node):
+    # template b: a sequence of two Hadamard gates is cancelled
+    if not _is_h(node):
+        return None
+    partner = node.next[node.op.qubits[0]]
+    if not _is_h(partner):
+        return None
+    return dag.rewrite([node, partner], [], node.seq)
+
+
+def _cancel_adj_cnot(dag, node):
+    # template c: a sequence of two CNOT gates is cancelled
+    if not _is_cnot(node):
+        return None
+    control, target = node.op.qubits
+    partner = node.next[control]
+    if not _is_cnot(partner) or partner is not node.next[target] or partner.op.qubits != node.op.qubits:
+        return None
+    return dag.rewrite([node, partner], [], node.seq)
+
+
+def _two_cx_to_cxx(dag, node):
+    # template d: two CNOT gates sharing the control qubit become a CXX gate
+    if not _is_cnot(node):
+        return None
+    control, target1 = node.op.qubits
+    partner = node.next[control]
+    if not _is_cnot(partner) or partner.op.qubits[0] != control:
+        return None
+    target2 = partner.op.qubits[1]
+    if target2 == target1:
+        return None
+    # either move the first CNOT forward or the second one backward
+    for slot in (partner.seq, node.seq):
+        if dag.can_replace([node, partner], slot):
+            return dag.rewrite([node, partner], [CXX().on(control, target1, target2)], slot)
+    return None
+
+
+def _flip_cnot(dag, node):
+    # template e: flip a CNOT gate and surround it with H gates
+    if node.expanded or not _is_cnot(node):
+        return None
+    q0, q1 = node.op.qubits
+    return dag.rewrite([node], [H(q0), H(q1), CNOT(q1, q0), H(q1), H(q0)], node.seq)
+
+
+def _reverse_cnot_with_hgate(dag, node):
+    # template f: a CNOT gate sandwiched by H gates on both qubits is flipped and the H gates are deleted
+    if not _is_cnot(node):
+        return None
+    control, target = node.op.qubits
+    sandwich = [node.prev[control], node.prev[target], node.next[control], node.next[target]]
+    if not all(_is_h(h_node) for h_node in sandwich):
+        return None
+    return dag.rewrite(sandwich + [node], [CNOT(target, control)], node.seq)
+
+
+TEMPLATE_RULES = {'a': _merge_flip_cnot, 'b': _cancel_adj_h, 'c': _cancel_adj_cnot, 'd': _two_cx_to_cxx,
+                  'e': _flip_cnot, 'f': _reverse_cnot_with_hgate}
+
+
+def template_rules(templates):
+    """
+    :param templates: characters of the templates, in order of priority
+    :return: list of the rule functions of the templates
+    """
+    rules = []
+    for template in templates:
+        if template not in TEMPLATE_RULES:
+            raise ValueError(f"Undefined template {template!r}. Choose template a, b, c, d, e, f")
+        rules.append(TEMPLATE_RULES[template])
+    return rules
+
+
+def run_rules(dag, rules, nodes):
+    """
+    Apply the rules until none matches, starting from the given nodes and re-examining the nodes around each rewrite
+    :param dag: the CircuitDag to rewrite
+    :param rules: rule functions as returned by template_rules
+    :param nodes: nodes to examine first
+    :return: number of rewrites of each rule
+    """
+    matches = [0] * len(rules)
+    worklist = deque(nodes)
+    while worklist:
+        node = worklist.popleft()
+        if not node.alive:
+            continue
+        for index, rule in enumerate(rules):
+            touched = rule(dag, node)
+            if touched is not None:
+                worklist.extend(touched)
+                matches[index] += 1
+                break
+    return matches
+
+
+@instrumented('dag')
+def apply_templates(circuit, templates='abcdf', cost_model=None, stats=None):
+    """
+    Apply several templates in a single pass: the DAG is built once, every rewrite only re-examines the operations
+    around it and the circuit is materialized once at the end
+    :param circuit: a circuit to optimize
+    :param templates: characters of the templates to apply, in order of priority. Templates e and f undo each other
+    :param cost_model: optional costModel.CostModel, a rewrite is then only applied when it lowers the cost
+    :param stats: optional dictionary filled with the number of matches of each template
+    :return: new circuit
+    """
+    rules = template_rules(templates)
+    dag = CircuitDag(circuit)
+    if cost_model is not None:
+        dag.accept = cost_model.lowers_cost
+    matches = run_rules(dag, rules, dag.nodes)
+    if stats is not None:
+        stats.update(matches=dict(zip(templates, matches)))
+    return dag.to_circuit()
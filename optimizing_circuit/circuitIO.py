@@ -0,0 +1,408 @@
+import ast
+import json
+import math
+import mmap
+import operator
+import re
+
+from cirq import (CCX, CNOT, CSWAP, CZ, DEFAULT_RESOLVERS, SWAP, Circuit, CZPowGate, H, I, LineQubit, Moment, S, T,
+                  X, Y, Z, ZPowGate, ZZPowGate, read_json, rx, ry, rz, to_json)
+from cirq.circuits.qasm_output import QasmUGate
+
+from .customGate import CXX, CXXX, CXn, custom_gate_resolver
+
+
+def circuit_to_json(circuit):
+    """
+    :param circuit: a circuit, which may contain the custom gates
+    :return: compact cirq JSON text of the circuit
+    """
+    return to_json(circuit, indent=None, separators=(',', ':'))
+
+
+def circuit_from_json(text):
+    """
+    :param text: cirq JSON text written by circuit_to_json
+    :return: the circuit
+    """
+    return read_json(json_text=text, resolvers=[custom_gate_resolver, *DEFAULT_RESOLVERS])
+
+
+def build_circuit(ops):
+    """
+    Build a circuit with the same moments as Circuit(ops), placing each operation in the earliest moment after the
+    operations on its qubits, but in one construction call instead of one insertion per operation
+    :param ops: iterable of operations
+    :return: the circuit
+    """
+    moments = []
+    # qubit -> index of the last moment acting on it
+    last = {}
+    for op in ops:
+        qubits = op.qubits
+        # an operation on no qubit, such as a global phase, goes in the first moment
+        i = max([last.get(qubit, -1) for qubit in qubits], default=-1) + 1
+        if i == len(moments):
+            moments.append([op])
+        else:
+            moments[i].append(op)
+        for qubit in qubits:
+            last[qubit] = i
+    return Circuit.from_moments(*[Moment.from_ops(*moment) for moment in moments])
+
+
+# gates written by name in OpenQASM 2 and in the JSONL format. cxx and cxxx are declared in the header of the files
+QASM_GATES = {'id': I, 'x': X, 'y': Y, 'z': Z, 'h': H, 's': S, 'sdg': S ** -1, 't': T, 'tdg': T ** -1, 'sx': X ** 0.5,
+              'sxdg': X ** -0.5, 'cx': CNOT, 'cy': Y.controlled(), 'cz': CZ, 'ch': H.controlled(), 'swap': SWAP,
+              'ccx': CCX, 'cswap': CSWAP, 'cxx': CXX(), 'cxxx': CXXX()}
+_QASM_NAMES = {gate: name for name, gate in QASM_GATES.items()}
+# the CNOT built in OpenQASM 2, read but never written
+_QASM_BUILTIN = {'CX': CNOT}
+
+
+def _u3(theta, phi, lmda):
+    return QasmUGate(theta / math.pi, phi / math.pi, lmda / math.pi)
+
+
+# gates with angle parameters, from the angles in radians. The controlled gates are exactly the ones defined in
+# qelib1.inc, without a phase on the control
+_QASM_PARAMETRIZED = {
+    'rx': rx, 'ry': ry, 'rz': rz,
+    'u1': lambda lmda: ZPowGate(exponent=lmda / math.pi), 'p': lambda lmda: ZPowGate(exponent=lmda / math.pi),
+    'u2': lambda phi, lmda: _u3(math.pi / 2, phi, lmda), 'u3': _u3, 'u': _u3, 'U': _u3,
+    'crx': lambda lmda: rx(lmda).controlled(), 'cry': lambda lmda: ry(lmda).controlled(),
+    'crz': lambda lmda: rz(lmda).controlled(),
+    'cu1': lambda lmda: CZPowGate(exponent=lmda / math.pi), 'cp': lambda lmda: CZPowGate(exponent=lmda / math.pi),
+    'cu3': lambda theta, phi, lmda: _u3(theta, phi, lmda).controlled(),
+    'rzz': lambda theta: ZZPowGate(exponent=theta / math.pi),
+}
+# fan-outs with any number of targets are written cxn<number of targets>
+_FAN_OUT_NAME = re.compile(r'cxn(\d+)$')
+
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+              ast.Pow: operator.pow, ast.USub: operator.neg, ast.UAdd: operator.pos}
+_FUNCTIONS = {'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'exp': math.exp, 'ln': math.log, 'sqrt': math.sqrt}
+
+
+def _gate_name(gate):
+    name = _QASM_NAMES.get(gate)
+    if name is None and isinstance(gate, CXn):
+        name = f"cxn{gate.num_targets}"
+    return name
+
+
+def _named_gate(name):
+    gate = QASM_GATES.get(name, _QASM_BUILTIN.get(name))
+    if gate is None:
+        match = _FAN_OUT_NAME.match(name)
+        if match:
+            gate = CXn(int(match.group(1)))
+    return gate
+
+
+def _fan_out_definition(name, num_targets):
+    targets = [f"t{i}" for i in range(num_targets)]
+    body = ' '.join(f"cx c,{target};" for target in targets)
+    return f"gate {name} c,{','.join(targets)} {{ {body} }}"
+
+
+def _eval_param(text):
+    # arithmetic on numbers and pi and the functions of OpenQASM 2 only, the parameters of a file are never evaluated
+    # as Python code
+    def value(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name) and node.id == 'pi':
+            return math.pi
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](value(node.left), value(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](value(node.operand))
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+                and len(node.args) == 1 and not node.keywords):
+            return _FUNCTIONS[node.func.id](value(node.args[0]))
+        raise ValueError(f"Unsupported gate parameter {text!r}")
+    try:
+        # ^ is the power operator of OpenQASM
+        tree = ast.parse(text.strip().replace('^', '**'), mode='eval')
+    except SyntaxError:
+        raise ValueError(f"Invalid gate parameter {text!r}") from None
+    return value(tree.body)
+
+
+def circuit_to_qasm(circuit, qubits=None):
+    """
+    Write a circuit in OpenQASM 2. The qubits become q[0], q[1], ...; gates without a QASM name are decomposed into
+    gates which have one
+    :param circuit: a circuit, which may contain the custom gates
+    :param qubits: qubits of the register in order, the qubits of the circuit sorted by default. Give the qubits of
+    the circuit before optimization so that a qubit whose gates all cancel does not shift the following ones
+    :return: the QASM text
+    """
+    qubits = sorted(circuit.all_qubits()) if qubits is None else list(qubits)
+    index = {qubit: i for i, qubit in enumerate(qubits)}
+    missing = circuit.all_qubits() - index.keys()
+    if missing:
+        raise ValueError(f"Qubits {sorted(missing)} of the circuit are not in the register")
+    definitions = {}
+    lines = []
+    for op in circuit.all_operations():
+        name = _gate_name(op.gate)
+        if name is not None:
+            if isinstance(op.gate, CXn) and name not in definitions:
+                definitions[name] = _fan_out_definition(name, op.gate.num_targets)
+            lines.append(f"{name} {','.join(f'q[{index[qubit]}]' for qubit in op.qubits)};")
+            continue
+        # let cirq decompose the operation, and keep its statements without the header
+        for line in Circuit(op).to_qasm(qubit_order=qubits).splitlines():
+            if line and not line.startswith(('OPENQASM', 'include', 'qreg', '//')):
+                lines.append(line)
+    header = ['OPENQASM 2.0;', 'include "qelib1.inc";', *definitions.values(), f"qreg q[{len(qubits)}];"]
+    return '\n'.join(header + lines) + '\n'
+
+
+def _qasm_statements(lines):
+    # statements of the QASM text without comments and gate definitions, a statement may span several lines
+    pending = ''
+    in_definition = False
+    for line in lines:
+        line = line.split('//', 1)[0]
+        if in_definition:
+            if '}' not in line:
+                continue
+            line = line.split('}', 1)[1]
+            in_definition = False
+        pending += ' ' + line
+        while True:
+            if pending.lstrip().startswith('gate '):
+                if '}' not in pending:
+                    in_definition = True
+                    pending = ''
+                    break
+                pending = pending.split('}', 1)[1]
+                continue
+            if ';' not in pending:
+                break
+            statement, pending = pending.split(';', 1)
+            statement = statement.strip()
+            if statement:
+                yield statement
+
+
+_REGISTER = re.compile(r'qreg\s+(\w+)\s*\[\s*(\d+)\s*\]$')
+_NAME = re.compile(r'\w+')
+_ARGUMENT = re.compile(r'(\w+)\s*(?:\[\s*(\d+)\s*\])?$')
+
+
+def _split_application(statement):
+    # name, text of the parameters or None, and text of the arguments of a gate application, None if the statement is
+    # not one. The parameters end at the parenthesis closing the first one, they may contain parentheses too
+    match = _NAME.match(statement)
+    if match is None:
+        return None
+    rest = statement[match.end():].lstrip()
+    params = None
+    if rest.startswith('('):
+        depth = 0
+        for end, char in enumerate(rest):
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if depth == 0:
+                break
+        if depth:
+            return None
+        params, rest = rest[1:end], rest[end + 1:]
+    arguments = rest.strip()
+    if not arguments:
+        return None
+    return match.group(), params, arguments
+
+
+def qasm_qubits(text):
+    """
+    :param text: OpenQASM 2 text
+    :return: the qubits of all the registers declared in the text, used or not, as circuit_from_qasm numbers them
+    """
+    num_qubits = 0
+    for statement in _qasm_statements(text.splitlines()):
+        match = _REGISTER.match(statement)
+        if match is not None:
+            num_qubits += int(match.group(2))
+    return LineQubit.range(num_qubits)
+
+
+def iter_qasm(lines):
+    """
+    Parse OpenQASM 2 statements into operations, one at a time, so that they can be fed to streaming.optimize_stream.
+    The registers become consecutive LineQubits in order of declaration. Measurements, barriers and classical
+    registers are ignored
+    :param lines: iterable of the lines of the text, for example mapped_lines(path)
+    :return: generator of operations
+    """
+    registers = {}
+    num_qubits = 0
+    # (name, params, qubits) -> operation, the same operations repeat a lot in large circuits
+    op_cache = {}
+    for statement in _qasm_statements(lines):
+        keyword = statement.split(None, 1)[0]
+        if keyword in ('OPENQASM', 'include', 'opaque', 'creg', 'measure', 'barrier', 'reset'):
+            continue
+        if keyword == 'qreg':
+            match = _REGISTER.match(statement)
+            if match is None:
+                raise ValueError(f"Invalid register declaration {statement!r}")
+            size = int(match.group(2))
+            registers[match.group(1)] = [LineQubit(num_qubits + i) for i in range(size)]
+            num_qubits += size
+            continue
+
+        application = _split_application(statement)
+        if application is None:
+            raise ValueError(f"Invalid statement {statement!r}")
+        name, params, arguments = application
+        operands = []
+        for argument in arguments.split(','):
+            argument_match = _ARGUMENT.match(argument.strip())
+            if argument_match is None or argument_match.group(1) not in registers:
+                raise ValueError(f"Invalid qubit {argument.strip()!r} in {statement!r}")
+            register = registers[argument_match.group(1)]
+            index = argument_match.group(2)
+            operands.append(register if index is None else [register[int(index)]])
+
+        # an argument without index applies the gate on every qubit of the register
+        width = max(len(operand) for operand in operands)
+        for i in range(width):
+            qubits = tuple(operand[i] if len(operand) > 1 else operand[0] for operand in operands)
+            key = (name, params, qubits)
+            op = op_cache.get(key)
+            if op is None:
+                op = _make_op(name, params, qubits, statement)
+                op_cache[key] = op
+            yield op
+
+
+def _make_op(name, params, qubits, statement):
+    if name in _QASM_PARAMETRIZED and params is not None:
+        values = [_eval_param(param) for param in params.split(',')]
+        try:
+            gate = _QASM_PARAMETRIZED[name](*values)
+        except TypeError:
+            raise ValueError(f"Wrong number of parameters for {name!r} in {statement!r}") from None
+        return gate.on(*qubits)
+    gate = _named_gate(name)
+    if gate is None or params is not None:
+        raise ValueError(f"Unsupported gate {name!r} in {statement!r}")
+    return gate.on(*qubits)
+
+
+def circuit_from_qasm(text):
+    """
+    :param text: OpenQASM 2 text, for example written by circuit_to_qasm
+    :return: the circuit
+    """
+    return build_circuit(iter_qasm(text.splitlines()))
+
+
+def mapped_lines(path):
+    """
+    :param path: a text file
+    :return: generator of the lines of the file, read through a memory map so that large files are not loaded at once
+    """
+    with open(path, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b''):
+                yield line.decode()
+
+
+def save_qasm(circuit, path):
+    with open(path, 'w') as file:
+        file.write(circuit_to_qasm(circuit))
+
+
+def load_qasm(path):
+    """
+    :param path: OpenQASM 2 file, read through a memory map
+    :return: the circuit
+    """
+    return build_circuit(iter_qasm(mapped_lines(path)))
+
+
+def _jsonl_lines(circuit):
+    qubits = sorted(circuit.all_qubits())
+    index = {qubit: i for i, qubit in enumerate(qubits)}
+    yield '{"qubits":' + to_json(qubits, indent=None, separators=(',', ':')) + '}\n'
+    for op in circuit.all_operations():
+        name = _gate_name(op.gate)
+        gate = json.dumps(name) if name is not None else to_json(op.gate, indent=None, separators=(',', ':'))
+        yield f"[{','.join([gate] + [str(index[qubit]) for qubit in op.qubits])}]\n"
+
+
+def circuit_to_jsonl(circuit):
+    """
+    Write a circuit in the JSONL format: a first line {"qubits": [...]} with the cirq JSON of the qubits, then one
+    line per operation [gate, qubit indices...]. The gate is a name of QASM_GATES or cxn<targets>, or the cirq JSON
+    of any other gate
+    :param circuit: a circuit, which may contain the custom gates
+    :return: the JSONL text
+    """
+    return ''.join(_jsonl_lines(circuit))
+
+
+def save_jsonl(circuit, path):
+    """
+    Write a circuit in the JSONL format of circuit_to_jsonl
+    :param circuit: a circuit, which may contain the custom gates
+    :param path: file to write
+    """
+    with open(path, 'w') as file:
+        file.writelines(_jsonl_lines(circuit))
+
+
+def iter_jsonl(lines):
+    """
+    Parse JSONL lines into operations, one at a time, so that they can be fed to streaming.optimize_stream without
+    holding the file or the circuit in memory
+    :param lines: iterable of the lines of the text, for example mapped_lines(path)
+    :return: generator of operations
+    """
+    resolvers = [custom_gate_resolver, *DEFAULT_RESOLVERS]
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    qubits = read_json(json_text=json.dumps(json.loads(header)['qubits']), resolvers=resolvers)
+    # text of the line -> operation, the same operations repeat a lot in large circuits
+    op_cache = {}
+    for line in lines:
+        op = op_cache.get(line)
+        if op is None:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            gate = record[0]
+            if isinstance(gate, str):
+                gate = _named_gate(gate)
+                if gate is None:
+                    raise ValueError(f"Unknown gate {record[0]!r}")
+            else:
+                gate = read_json(json_text=json.dumps(gate), resolvers=resolvers)
+            op = gate.on(*[qubits[i] for i in record[1:]])
+            op_cache[line] = op
+        yield op
+
+
+def circuit_from_jsonl(text):
+    """
+    :param text: JSONL text, for example written by circuit_to_jsonl
+    :return: the circuit
+    """
+    return build_circuit(iter_jsonl(text.splitlines()))
+
+
+def load_jsonl(path):
+    """
+    :param path: file written by save_jsonl, read through a memory map
+    :return: the circuit
+    """
+    return build_circuit(iter_jsonl(mapped_lines(path)))
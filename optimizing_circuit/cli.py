@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+
+# pass letters of each preset, see pipeline.optimize
+PRESETS = {'fast': 'bcd', 'default': 'fbcd', 'full': 'afbcd'}
+FORMATS = ('qasm', 'jsonl', 'json')
+EXTENSIONS = {'.qasm': 'qasm', '.jsonl': 'jsonl', '.json': 'json'}
+REPORT_FIELDS = ['input', 'output', 'ops_before', 'ops_after', 'depth_before', 'depth_after', 'seconds', 'error']
+
+
+def _format_of(path, default=None):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def sniff_format(text):
+    # format of a text read from stdin
+    stripped = text.lstrip()
+    if stripped.startswith('OPENQASM'):
+        return 'qasm'
+    if stripped.startswith('{"qubits"'):
+        return 'jsonl'
+    return 'json'
+
+
+def read_circuit(text, fmt):
+    # cirq is only imported once a circuit is read
+    from . import circuitIO
+    if fmt == 'qasm':
+        if not text.lstrip().startswith('OPENQASM'):
+            raise ValueError("Not an OpenQASM file, the OPENQASM header is missing")
+        return circuitIO.circuit_from_qasm(text)
+    if fmt == 'jsonl':
+        return circuitIO.circuit_from_jsonl(text)
+    return circuitIO.circuit_from_json(text)
+
+
+def write_circuit(circuit, fmt, qubits=None):
+    # qubits: register of the QASM output, see circuitIO.circuit_to_qasm
+    from . import circuitIO
+    if fmt == 'qasm':
+        return circuitIO.circuit_to_qasm(circuit, qubits)
+    if fmt == 'jsonl':
+        return circuitIO.circuit_to_jsonl(circuit)
+    return circuitIO.circuit_to_json(circuit)
+
+
+def optimize_text(text, fmt, passes, max_rounds=10, output_format=None, compact=False):
+    """
+    :param text: the circuit in the given format
+    :param fmt: 'qasm', 'jsonl' or 'json'
+    :param passes: characters of the templates given to pipeline.optimize
+    :param max_rounds: maximum number of rounds given to pipeline.optimize
+    :param output_format: format of the optimized circuit, the input format by default
+    :param compact: given to pipeline.optimize, run the passes on the array form of the circuit
+    :return: tuple (text of the optimized circuit, dictionary with the gate counts, depths and seconds)
+    """
+    from . import circuitIO
+    from .pipeline import circuit_cost, optimize
+    circuit = read_circuit(text, fmt)
+    # the output keeps the qubits of the input, also the ones left without gates
+    qubits = circuitIO.qasm_qubits(text) if fmt == 'qasm' else sorted(circuit.all_qubits())
+    start = time.perf_counter()
+    opt = optimize(circuit, passes, max_rounds, compact=compact).circuit
+    seconds = time.perf_counter() - start
+    ops_before, depth_before = circuit_cost(circuit)
+    ops_after, depth_after = circuit_cost(opt)
+    summary = {'ops_before': ops_before, 'ops_after': ops_after, 'depth_before': depth_before,
+               'depth_after': depth_after, 'seconds': seconds}
+    return write_circuit(opt, output_format or fmt, qubits), summary
+
+
+def optimize_file(path, output, passes, max_rounds=10, output_format=None, compact=False):
+    """
+    Optimize one file, it runs in a worker process when several files are optimized in parallel
+    :param path: input file, its format is given by its extension
+    :param output: file to write the optimized circuit to, None to not write it
+    :return: row of the report, with the keys of REPORT_FIELDS
+    """
+    row = {field: None for field in REPORT_FIELDS}
+    row.update(input=path, output=output)
+    try:
+        with open(path) as file:
+            text = file.read()
+        result, summary = optimize_text(text, _format_of(path, 'json'), passes, max_rounds, output_format, compact)
+        row.update(summary)
+        if output is not None:
+            with open(output, 'w') as file:
+                file.write(result)
+    except Exception as error:
+        row['error'] = f"{type(error).__name__}: {error}"
+    return row
+
+
+def optimize_stdin(fmt, passes, max_rounds=10, output_format=None, compact=False):
+    """
+    Optimize the circuit read from stdin and write the optimized circuit to stdout, errors are reported like in
+    optimize_file
+    :param fmt: format of stdin, guessed from the text when None
+    :return: row of the report, with the keys of REPORT_FIELDS
+    """
+    row = {field: None for field in REPORT_FIELDS}
+    row.update(input='-', output='-')
+    try:
+        text = sys.stdin.read()
+        result, summary = optimize_text(text, fmt or sniff_format(text), passes, max_rounds, output_format,
+                                        compact)
+        row.update(summary)
+        sys.stdout.write(result)
+    except Exception as error:
+        row['error'] = f"{type(error).__name__}: {error}"
+    return row
+
+
+def collect_inputs(paths):
+    """
+    :param paths: files and directories given on the command line
+    :return: the files, with the circuit files found directly in the directories, in sorted order
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if _format_of(name) is not None and os.path.isfile(os.path.join(path, name))))
+        else:
+            files.append(path)
+    return files
+
+
+def _output_path(path, output_dir, output_format):
+    name = os.path.basename(path)
+    if output_format is not None:
+        name = os.path.splitext(name)[0] + '.' + output_format
+    return os.path.join(output_dir, name)
+
+
+def print_report(rows, file=sys.stderr):
+    for row in rows:
+        if row['error']:
+            print(f"{row['input']}: {row['error']}", file=file)
+        else:
+            print(f"{row['input']}: {row['ops_before']} -> {row['ops_after']} gates, "
+                  f"depth {row['depth_before']} -> {row['depth_after']}, {row['seconds']:.3f} s", file=file)
+    done = [row for row in rows if not row['error']]
+    if done:
+        print(f"{len(done)} circuits: {sum(row['ops_before'] for row in done)} -> "
+              f"{sum(row['ops_after'] for row in done)} gates, {sum(row['seconds'] for row in done):.3f} s",
+              file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='optimize-circuit',
+                                     description="Optimize quantum circuits with the template transformers")
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help="circuit files (.qasm, .jsonl, .json) or directories of them, - for stdin")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--passes', help="template letters a-f applied in each round, for example fbcd")
+    group.add_argument('--preset', choices=sorted(PRESETS), default='default',
+                       help="; ".join(f"{name}: {passes}" for name, passes in PRESETS.items()))
+    parser.add_argument('--max-rounds', type=int, default=10)
+    parser.add_argument('--compact', action='store_true',
+                        help="run the passes on the array form of the circuits, see compactCircuit")
+    parser.add_argument('--format', choices=FORMATS, help="format of stdin, guessed from the text by default")
+    parser.add_argument('--output-format', choices=FORMATS, help="format of the outputs, the input format by default")
+    parser.add_argument('-o', '--output-dir', help="directory of the optimized files, nothing is written without it")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="parallel processes, all cores by default")
+    parser.add_argument('--report', help="write the summary report to this JSON file")
+    args = parser.parse_args(argv)
+
+    passes = args.passes if args.passes is not None else PRESETS[args.preset]
+    undefined = set(passes) - set('abcdef')
+    if undefined:
+        parser.error(f"undefined templates {''.join(sorted(undefined))}. Choose template a, b, c, d, e, f")
+
+    if args.inputs == ['-']:
+        # stdin in, optimized circuit on stdout and report on stderr
+        rows = [optimize_stdin(args.format, passes, args.max_rounds, args.output_format, args.compact)]
+    else:
+        files = collect_inputs(args.inputs)
+        if args.output_dir is not None:
+            os.makedirs(args.output_dir, exist_ok=True)
+        outputs = [None if args.output_dir is None else _output_path(path, args.output_dir, args.output_format)
+                   for path in files]
+        jobs = args.jobs or os.cpu_count() or 1
+        if jobs == 1 or len(files) <= 1:
+            rows = [optimize_file(path, output, passes, args.max_rounds, args.output_format, args.compact)
+                    for path, output in zip(files, outputs)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            # import the optimizer once here: with the fork start method, workers forked from this process then start
+            # with it loaded instead of each importing cirq again. Spawned workers import it themselves
+            from . import pipeline  # noqa: F401
+            with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+                futures = [executor.submit(optimize_file, path, output, passes, args.max_rounds, args.output_format,
+                                           args.compact)
+                           for path, output in zip(files, outputs)]
+                rows = [future.result() for future in futures]
+
+    print_report(rows)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(rows, file, indent=2)
+    return 1 if any(row['error'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+import numpy as np
+from cirq import (Circuit, CXPowGate, CZPowGate, HPowGate, ISwapPowGate, SwapPowGate, XPowGate, XXPowGate, YPowGate,
+                  YYPowGate, ZPowGate, ZZPowGate, X, Y, Z)
+
+from .customGate import CXn, CXX, CXXX
+
+
+# gate families stored by opcode, the exponent of the gate goes into params
+GATE_FAMILIES = [HPowGate, XPowGate, YPowGate, ZPowGate, CZPowGate, CXPowGate, SwapPowGate, ISwapPowGate, XXPowGate,
+                 YYPowGate, ZZPowGate]
+OP_H, OP_X, OP_Y, OP_Z, OP_CZ, OP_CNOT, OP_SWAP, OP_ISWAP, OP_XX, OP_YY, OP_ZZ = range(len(GATE_FAMILIES))
+OP_CXX = len(GATE_FAMILIES)
+OP_CXXX = OP_CXX + 1
+# any other operation, kept as it is in CompactCircuit.others
+OP_OTHER = -1
+
+# columns of CompactCircuit.qubits, the unused ones are -1. An operation on more qubits is an OP_OTHER row with -1
+# in all its columns, its qubits are those of its operation in CompactCircuit.others
+MAX_ARITY = 4
+
+_FAMILY_OPCODE = {family: opcode for opcode, family in enumerate(GATE_FAMILIES)}
+_PAULIS = {OP_X: X, OP_Y: Y, OP_Z: Z}
+
+
+class CompactCircuit:
+    """
+    Array form of a circuit for the optimizer hot path, see pipeline.optimize: one row per operation in parallel NumPy
+    arrays of opcode, qubit indices and exponent, instead of cirq Moment and Operation objects
+    """
+    __slots__ = ('opcode', 'qubits', 'params', 'others', 'qubit_order')
+
+    def __init__(self, opcode, qubits, params, others, qubit_order):
+        self.opcode = opcode
+        self.qubits = qubits
+        self.params = params
+        # opcode OP_OTHER rows store the index of their operation in this list as param
+        self.others = others
+        self.qubit_order = qubit_order
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactCircuit):
+            return NotImplemented
+        return (self.qubit_order == other.qubit_order and np.array_equal(self.opcode, other.opcode)
+                and np.array_equal(self.qubits, other.qubits) and np.array_equal(self.params, other.params)
+                and [self.others[int(i)] for i in self.params[self.opcode == OP_OTHER]]
+                == [other.others[int(i)] for i in other.params[other.opcode == OP_OTHER]])
+
+    def row_qubits(self):
+        """
+        :return: list of the qubit indices of every row, also of the operations on more than MAX_ARITY qubits
+        """
+        rows = [[qubit for qubit in row if qubit >= 0] for row in self.qubits.tolist()]
+        wide = np.flatnonzero((self.opcode == OP_OTHER) & (self.qubits[:, 0] < 0)).tolist()
+        if wide:
+            index = {qubit: i for i, qubit in enumerate(self.qubit_order)}
+            for i in wide:
+                rows[i] = [index[qubit] for qubit in self.others[int(self.params[i])].qubits]
+        return rows
+
+    def cost(self):
+        """
+        :return: tuple (number of operations, depth), the depth of the circuit built by to_circuit
+        """
+        # moment of each row as placed by the earliest insert strategy of cirq
+        level = {}
+        depth = 0
+        for row in self.row_qubits():
+            moment = max((level.get(qubit, 0) for qubit in row), default=0) + 1
+            for qubit in row:
+                level[qubit] = moment
+            depth = max(depth, moment)
+        return len(self), depth
+
+    @property
+    def nbytes(self):
+        return self.opcode.nbytes + self.qubits.nbytes + self.params.nbytes
+
+    @classmethod
+    def from_circuit(cls, circuit, qubit_order=None):
+        """
+        :param circuit: a circuit
+        :param qubit_order: list of the qubits, sorted qubits of the circuit by default
+        :return: the compact form of the circuit
+        """
+        if qubit_order is None:
+            qubit_order = sorted(circuit.all_qubits())
+        index = {qubit: i for i, qubit in enumerate(qubit_order)}
+        opcodes = []
+        rows = []
+        params = []
+        others = []
+        for op in circuit.all_operations():
+            gate = op.gate
+            opcode = OP_OTHER
+            param = 1.0
+            if isinstance(gate, CXn):
+                # fan-outs of other sizes are kept as they are
+                opcode = {2: OP_CXX, 3: OP_CXXX}.get(gate.num_targets, OP_OTHER)
+            elif getattr(gate, 'global_shift', None) == 0 and isinstance(gate.exponent, (int, float)):
+                for family in type(gate).__mro__:
+                    if family in _FAMILY_OPCODE:
+                        opcode = _FAMILY_OPCODE[family]
+                        param = float(gate.exponent)
+                        break
+            if opcode == OP_OTHER:
+                param = float(len(others))
+                others.append(op)
+            opcodes.append(opcode)
+            params.append(param)
+            row = [index[qubit] for qubit in op.qubits] if len(op.qubits) <= MAX_ARITY else []
+            rows.append(row + [-1] * (MAX_ARITY - len(row)))
+        return cls(np.array(opcodes, dtype=np.int8), np.array(rows, dtype=np.int32).reshape(-1, MAX_ARITY),
+                   np.array(params, dtype=np.float64), others, list(qubit_order))
+
+    def to_circuit(self):
+        """
+        :return: the circuit, built in one construction
+        """
+        qubit_order = self.qubit_order
+        operations = []
+        for opcode, row, param in zip(self.opcode.tolist(), self.qubits.tolist(), self.params.tolist()):
+            if opcode == OP_OTHER:
+                operations.append(self.others[int(param)])
+                continue
+            qubits = [qubit_order[i] for i in row if i >= 0]
+            if opcode == OP_CXX:
+                gate = CXX()
+            elif opcode == OP_CXXX:
+                gate = CXXX()
+            elif opcode in _PAULIS and param == 1.0:
+                gate = _PAULIS[opcode]
+            else:
+                gate = GATE_FAMILIES[opcode](exponent=param)
+            operations.append(gate.on(*qubits))
+        return Circuit(operations)
+
+    def select(self, keep):
+        """
+        :param keep: boolean mask or index array of the rows to keep, in order
+        :return: new compact circuit with these rows
+        """
+        return CompactCircuit(self.opcode[keep], self.qubits[keep], self.params[keep], self.others,
+                              self.qubit_order)
+
+
+def _is_gate(compact, opcode):
+    # exactly the gate of the family, H or CNOT, not one of its powers
+    return ((compact.opcode == opcode) & (compact.params == 1.0)).tolist()
+
+
+def _neighbours(compact):
+    # index of the previous and next row on each qubit of every row, -1 if none
+    rows = compact.row_qubits()
+    prev = [[-1] * len(row) for row in rows]
+    nxt = [[-1] * len(row) for row in rows]
+    last = {}
+    for i, row in enumerate(rows):
+        for slot, qubit in enumerate(row):
+            j = last.get(qubit)
+            if j is not None:
+                prev[i][slot] = j
+                nxt[j][rows[j].index(qubit)] = i
+            last[qubit] = i
+    return rows, prev, nxt
+
+
+def _cancel_pairs(compact, opcode):
+    # remove pairs of the same self-inverse gate which follow each other on all their qubits
+    rows = compact.row_qubits()
+    is_gate = _is_gate(compact, opcode)
+    keep = [True] * len(rows)
+    # kept rows on each qubit, the last one on top
+    stacks = {}
+    for i, qubits in enumerate(rows):
+        if is_gate[i]:
+            tops = [stacks[qubit][-1] if stacks.get(qubit) else -1 for qubit in qubits]
+            j = tops[0]
+            if j >= 0 and is_gate[j] and rows[j] == qubits and all(top == j for top in tops):
+                keep[j] = keep[i] = False
+                for qubit in qubits:
+                    stacks[qubit].pop()
+                continue
+        for qubit in qubits:
+            stacks.setdefault(qubit, []).append(i)
+    return compact.select(np.array(keep, dtype=bool))
+
+
+def compact_cancel_adj_h(compact):
+    """
+    Apply the template b on a compact circuit: a sequence of two Hadamard gates is cancelled
+    :param compact: a compact circuit to optimize
+    :return: new compact circuit
+    """
+    return _cancel_pairs(compact, OP_H)
+
+
+def compact_cancel_adj_cnot(compact):
+    """
+    Apply the template c on a compact circuit: a sequence of two CNOT gates is cancelled
+    :param compact: a compact circuit to optimize
+    :return: new compact circuit
+    """
+    return _cancel_pairs(compact, OP_CNOT)
+
+
+def compact_two_cx_to_cxx(compact):
+    """
+    Apply the template d on a compact circuit: two CNOT gates following each other on the same control qubit
+    transform to a CXX gate
+    :param compact: a compact circuit to optimize
+    :return: new compact circuit
+    """
+    opcode = compact.opcode.copy()
+    qubits = compact.qubits.copy()
+    rows = compact.row_qubits()
+    is_cnot = _is_gate(compact, OP_CNOT)
+    keep = [True] * len(rows)
+    # last kept row on each qubit
+    last = {}
+    for i, row in enumerate(rows):
+        if is_cnot[i]:
+            control, target = row[0], row[1]
+            j = last.get(control, -1)
+            if j >= 0 and opcode[j] == OP_CNOT and is_cnot[j] and rows[j][0] == control and rows[j][1] != target:
+                pre_target = rows[j][1]
+                merged = [control, pre_target, target, -1]
+                if last.get(target, -1) < j:
+                    # nothing on the target since the first CNOT, the CXX goes in its place
+                    slot, dropped = j, i
+                elif last.get(pre_target, -1) == j:
+                    # nothing on the first target since the first CNOT, the CXX goes in place of the second one
+                    slot, dropped = i, j
+                else:
+                    slot = -1
+                if slot >= 0:
+                    opcode[slot] = OP_CXX
+                    qubits[slot] = merged
+                    rows[slot] = merged[:3]
+                    keep[dropped] = False
+                    for qubit in merged[:3]:
+                        if last.get(qubit, -1) < slot:
+                            last[qubit] = slot
+                    continue
+        for qubit in row:
+            last[qubit] = i
+    result = CompactCircuit(opcode, qubits, compact.params, compact.others, compact.qubit_order)
+    return result.select(np.array(keep, dtype=bool))
+
+
+def compact_flip_cnot(compact):
+    """
+    Apply the template e on a compact circuit: flip every CNOT gate and surround it with H gates
+    :param compact: a compact circuit
+    :return: new compact circuit
+    """
+    is_cnot = np.array(_is_gate(compact, OP_CNOT), dtype=bool)
+    counts = np.where(is_cnot, 5, 1)
+    opcode = np.repeat(compact.opcode, counts)
+    qubits = np.repeat(compact.qubits, counts, axis=0)
+    params = np.repeat(compact.params, counts)
+
+    # rows of each CNOT become H(q0), H(q1), CNOT(q1, q0), H(q1), H(q0)
+    starts = (np.cumsum(counts) - counts)[is_cnot]
+    q0 = compact.qubits[is_cnot, 0]
+    q1 = compact.qubits[is_cnot, 1]
+    for offset, (first, second) in enumerate([(q0, None), (q1, None), (q1, q0), (q1, None), (q0, None)]):
+        rows = starts + offset
+        opcode[rows] = OP_CNOT if second is not None else OP_H
+        qubits[rows, 0] = first
+        qubits[rows, 1] = second if second is not None else -1
+    return CompactCircuit(opcode, qubits, params, compact.others, compact.qubit_order)
+
+
+def compact_reverse_cnot_with_hgate(compact):
+    """
+    Apply template f on a compact circuit: a CNOT gate sandwiched by H gates on both qubits is flipped and the H
+    gates are deleted
+    :param compact: a compact circuit to optimize
+    :return: new compact circuit
+    """
+    rows, prev, nxt = _neighbours(compact)
+    is_h = _is_gate(compact, OP_H)
+    is_cnot = _is_gate(compact, OP_CNOT)
+    qubits = compact.qubits.copy()
+    keep = [True] * len(rows)
+    for i, row in enumerate(rows):
+        if not is_cnot[i]:
+            continue
+        sandwich = [prev[i][0], prev[i][1], nxt[i][0], nxt[i][1]]
+        if all(j >= 0 and is_h[j] and keep[j] for j in sandwich):
+            for j in sandwich:
+                keep[j] = False
+            qubits[i, 0], qubits[i, 1] = row[1], row[0]
+    result = CompactCircuit(compact.opcode, qubits, compact.params, compact.others, compact.qubit_order)
+    return result.select(np.array(keep, dtype=bool))
+
+
+def compact_merge_flip_cnot(compact):
+    """
+    Apply the template a on a compact circuit: CNOT gates one after the other on a target, each control sandwiched by
+    H gates, transform to H gates on the target around a CXX or CXXX gate. A row holds at most MAX_ARITY qubits, so
+    a fan-in of more than three controls is merged two or three controls at a time, over the rounds of the pipeline
+    :param compact: a compact circuit to optimize
+    :return: new compact circuit
+    """
+    rows, prev, nxt = _neighbours(compact)
+    is_h = _is_gate(compact, OP_H)
+    is_cnot = _is_gate(compact, OP_CNOT)
+    # rows of a match and their neighbours, whose prev and next are out of date after the match
+    used = [False] * len(rows)
+    # number of rows each row becomes: 0 for the gates of a match, 3 for the row the new gates take the place of
+    counts = [1] * len(rows)
+    anchors = {}
+    # row of a match -> row the new gates take the place of, a fan-in may go on right after another on its target
+    placed = {}
+
+    def sandwiched(i, target):
+        if i < 0 or not is_cnot[i] or used[i] or rows[i][1] != target:
+            return False
+        before, after = prev[i][0], nxt[i][0]
+        return before >= 0 and after >= 0 and is_h[before] and is_h[after] and not used[before] and not used[after]
+
+    for first, row in enumerate(rows):
+        if not is_cnot[first]:
+            continue
+        target = row[1]
+        if not sandwiched(first, target):
+            continue
+        cnots = [first]
+        controls = [row[0]]
+        while len(cnots) < 4:
+            i = nxt[cnots[-1]][1]
+            if not sandwiched(i, target) or rows[i][0] in controls:
+                break
+            cnots.append(i)
+            controls.append(rows[i][0])
+        if len(cnots) < 2:
+            continue
+        # a run of four or more is split two by two first, so that no single CNOT is left at its end
+        size = 2 if len(cnots) == 4 else len(cnots)
+        cnots = cnots[:size]
+        controls = controls[:size]
+        hadamards = [j for i in cnots for j in (prev[i][0], nxt[i][0])]
+        before = [prev[first][1]] + [prev[j][0] for j in hadamards[::2]]
+        after = [nxt[cnots[-1]][1]] + [nxt[j][0] for j in hadamards[1::2]]
+        # the new gates take the place of a row of the match after all the operations before it and before all the
+        # operations after it
+        last_before = max(placed.get(j, j) for j in before)
+        first_after = min((j for j in after if j >= 0), default=len(rows))
+        anchor = min((i for i in cnots + hadamards if i > last_before), default=first_after)
+        if anchor >= first_after:
+            continue
+        for i in cnots + hadamards:
+            counts[i] = 0
+            used[i] = True
+            placed[i] = anchor
+        # the next CNOT on the target stays free, the control sides are done for this pass
+        for j in before + after[1:]:
+            if j >= 0:
+                used[j] = True
+        counts[anchor] = 3
+        anchors[anchor] = [target] + controls
+
+    counts = np.array(counts)
+    opcode = np.repeat(compact.opcode, counts)
+    qubits = np.repeat(compact.qubits, counts, axis=0)
+    params = np.repeat(compact.params, counts)
+    starts = np.cumsum(counts) - counts
+    for anchor, fan_out in anchors.items():
+        start = starts[anchor]
+        opcode[start:start + 3] = [OP_H, OP_CXX if len(fan_out) == 3 else OP_CXXX, OP_H]
+        qubits[start:start + 3] = [[fan_out[0], -1, -1, -1], fan_out + [-1] * (MAX_ARITY - len(fan_out)),
+                                   [fan_out[0], -1, -1, -1]]
+        params[start:start + 3] = 1.0
+    return CompactCircuit(opcode, qubits, params, compact.others, compact.qubit_order)
+
+
+COMPACT_TRANSFORMERS = {'a': compact_merge_flip_cnot, 'b': compact_cancel_adj_h, 'c': compact_cancel_adj_cnot,
+                        'd': compact_two_cx_to_cxx, 'e': compact_flip_cnot, 'f': compact_reverse_cnot_with_hgate}
+
+
+def apply_compact(circuit, templates):
+    """
+    Convert a circuit to its compact form once, apply the templates one after the other on it and convert back
+    :param circuit: a circuit to optimize
+    :param templates: characters of the templates to apply, in order
+    :return: new circuit
+    """
+    compact = CompactCircuit.from_circuit(circuit)
+    for template in templates:
+        if template not in COMPACT_TRANSFORMERS:
+            raise ValueError(f"Undefined template {template!r}. Choose template a, b, c, d, e, f")
+        compact = COMPACT_TRANSFORMERS[template](compact)
+    return compact.to_circuit()
@@ -0,0 +1,213 @@
+import json
+import math
+from collections import deque
+
+from cirq import CNOT, GridQubit, LineQubit, NamedQubit
+
+from .customGate import CXn
+
+
+def gate_name(gate):
+    """
+    :param gate: a gate
+    :return: the name the gate has in the duration and error tables: the class name for the custom gates, the cirq
+    string otherwise, for example H, CNOT, CZ, X**0.5
+    """
+    if isinstance(gate, CXn):
+        return type(gate).__name__
+    return str(gate)
+
+
+def qubit_key(qubit):
+    """
+    :param qubit: a qubit
+    :return: how the qubit is written in the connectivity graph: the index of a LineQubit, [row, col] of a GridQubit,
+    the name of a NamedQubit
+    """
+    if isinstance(qubit, LineQubit):
+        return qubit.x
+    if isinstance(qubit, GridQubit):
+        return qubit.row, qubit.col
+    if isinstance(qubit, NamedQubit):
+        return qubit.name
+    return str(qubit)
+
+
+def _coupled_pairs(op):
+    # pairs of qubits which must be connected to apply the gate: control and target of CNOT gates and fan-outs
+    if isinstance(op.gate, CXn) or op.gate == CNOT:
+        control = op.qubits[0]
+        return [(control, target) for target in op.qubits[1:]]
+    return [(op.qubits[i], op.qubits[j]) for i in range(len(op.qubits)) for j in range(i + 1, len(op.qubits))]
+
+
+class CostModel:
+    """
+    Cost of circuits on a device: duration and error rate of each gate, and the connectivity graph of the qubits.
+    A multi-qubit gate on qubits that are not connected pays the SWAP gates needed to bring them next to each other
+    """
+
+    def __init__(self, durations=None, errors=None, default_durations=None, default_errors=None, edges=None,
+                 objective='duration'):
+        """
+        :param durations: dictionary from gate name (see gate_name) to duration in ns
+        :param errors: dictionary from gate name to error rate
+        :param default_durations: dictionary from number of qubits to the duration of the gates not in durations
+        :param default_errors: dictionary from number of qubits to the error rate of the gates not in errors
+        :param edges: pairs of connected qubits, written as in qubit_key. None for all-to-all connectivity
+        :param objective: 'duration' to minimize the total gate time, 'fidelity' to maximize the estimated fidelity,
+        'gates' to minimize the number of operations
+        """
+        if objective not in ('duration', 'fidelity', 'gates'):
+            raise ValueError(f"Undefined objective {objective!r}. Choose duration, fidelity, gates")
+        self.durations = dict(durations or {})
+        self.errors = dict(errors or {})
+        self.default_durations = {1: 25.0, 2: 300.0, 3: 600.0, 4: 900.0}
+        self.default_durations.update(default_durations or {})
+        self.default_errors = {1: 1e-4, 2: 1e-2, 3: 2e-2, 4: 3e-2}
+        self.default_errors.update(default_errors or {})
+        self.objective = objective
+        # qubit key -> {qubit key -> number of edges between them}, None for all-to-all connectivity
+        self.distances = None
+        if edges is not None:
+            self.distances = self._all_distances(edges)
+
+    @classmethod
+    def from_file(cls, path, objective='duration'):
+        """
+        Load a cost model from a JSON file with the optional keys durations, errors, default_durations,
+        default_errors and edges, the same as the arguments of CostModel
+        :param path: the JSON file of the device
+        :param objective: see CostModel
+        """
+        with open(path) as file:
+            data = json.load(file)
+        edges = data.get('edges')
+        if edges is not None:
+            edges = [tuple(tuple(key) if isinstance(key, list) else key for key in edge) for edge in edges]
+        return cls(data.get('durations'), data.get('errors'),
+                   {int(k): v for k, v in data.get('default_durations', {}).items()},
+                   {int(k): v for k, v in data.get('default_errors', {}).items()},
+                   edges, objective)
+
+    @staticmethod
+    def _all_distances(edges):
+        neighbours = {}
+        for a, b in edges:
+            neighbours.setdefault(a, set()).add(b)
+            neighbours.setdefault(b, set()).add(a)
+        distances = {}
+        # breadth-first search from every qubit, the graphs of devices are small
+        for source in neighbours:
+            distance = {source: 0}
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                for other in neighbours[node]:
+                    if other not in distance:
+                        distance[other] = distance[node] + 1
+                        queue.append(other)
+            distances[source] = distance
+        return distances
+
+    def gate_duration(self, gate):
+        name = gate_name(gate)
+        if name in self.durations:
+            return self.durations[name]
+        return self.default_durations.get(gate.num_qubits(), max(self.default_durations.values()))
+
+    def gate_error(self, gate):
+        name = gate_name(gate)
+        if name in self.errors:
+            return self.errors[name]
+        return self.default_errors.get(gate.num_qubits(), max(self.default_errors.values()))
+
+    def swaps_needed(self, op):
+        """
+        :param op: an operation
+        :return: number of SWAP gates needed to bring the coupled qubits of the operation next to each other, inf when
+        they are not connected at all
+        """
+        if self.distances is None or len(op.qubits) < 2:
+            return 0
+        swaps = 0
+        for a, b in _coupled_pairs(op):
+            distance = self.distances.get(qubit_key(a), {}).get(qubit_key(b))
+            if distance is None:
+                return math.inf
+            swaps += distance - 1
+        return swaps
+
+    def op_duration(self, op):
+        swaps = self.swaps_needed(op)
+        duration = self.gate_duration(op.gate)
+        return duration + swaps * self.durations.get('SWAP', 3 * self.gate_duration(CNOT)) if swaps else duration
+
+    def op_fidelity(self, op):
+        swaps = self.swaps_needed(op)
+        if swaps == math.inf:
+            return 0.0
+        swap_error = self.errors.get('SWAP', 1 - (1 - self.gate_error(CNOT)) ** 3)
+        return (1 - self.gate_error(op.gate)) * (1 - swap_error) ** swaps
+
+    def op_cost(self, op):
+        """
+        Cost of one operation for the objective, added over the operations of a rewrite
+        """
+        if self.objective == 'duration':
+            return self.op_duration(op)
+        if self.objective == 'fidelity':
+            fidelity = self.op_fidelity(op)
+            return -math.log(fidelity) if fidelity > 0 else math.inf
+        return 1
+
+    def ops_cost(self, ops):
+        return sum(self.op_cost(op) for op in ops)
+
+    def lowers_cost(self, old_ops, new_ops):
+        """
+        Local check of a rewrite: the costs of the operations are summed, so for the duration objective this compares
+        total gate time, not the critical path which the rewrite may lengthen
+        :return: True if replacing the operations old_ops by new_ops lowers the cost
+        """
+        return self.ops_cost(new_ops) < self.ops_cost(old_ops)
+
+    def duration(self, circuit):
+        """
+        :param circuit: a circuit
+        :return: estimated duration in ns: each operation starts when all its qubits are free
+        """
+        free_at = {}
+        for op in circuit.all_operations():
+            end = max((free_at.get(qubit, 0.0) for qubit in op.qubits), default=0.0) + self.op_duration(op)
+            for qubit in op.qubits:
+                free_at[qubit] = end
+        return max(free_at.values(), default=0.0)
+
+    def fidelity(self, circuit):
+        """
+        :param circuit: a circuit
+        :return: estimated fidelity, the product of the success probabilities of the operations
+        """
+        return math.prod(self.op_fidelity(op) for op in circuit.all_operations())
+
+    def cost(self, circuit):
+        """
+        :param circuit: a circuit
+        :return: cost of the whole circuit for the objective, lower is better
+        """
+        if self.objective == 'duration':
+            return self.duration(circuit)
+        if self.objective == 'fidelity':
+            fidelity = self.fidelity(circuit)
+            return -math.log(fidelity) if fidelity > 0 else math.inf
+        return sum(1 for _ in circuit.all_operations())
+
+    def report(self, origin, opt):
+        """
+        :param origin: the original circuit
+        :param opt: the optimized circuit
+        :return: dictionary with the estimated duration and fidelity of both circuits
+        """
+        return {'duration_before': self.duration(origin), 'duration_after': self.duration(opt),
+                'fidelity_before': self.fidelity(origin), 'fidelity_after': self.fidelity(opt)}
@@ -0,0 +1,115 @@
+import functools
+
+import cirq
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def fan_out_unitary(num_targets):
+    """
+    Unitary of a CNOT fan-out, computed once per size. The first qubit is the most significant bit of the basis index
+    and controls an X gate on every other qubit
+    :param num_targets: number of target qubits
+    :return: read-only matrix of size 2^(num_targets + 1)
+    """
+    dim = 2 ** (num_targets + 1)
+    half = dim // 2
+    permutation = np.arange(dim)
+    # when the control is 1, flipping all targets reverses the lower half of the basis
+    permutation[half:] = permutation[half:][::-1]
+    unitary = np.eye(dim)[permutation]
+    unitary.setflags(write=False)
+    return unitary
+
+
+@cirq.value_equality
+class CXn(cirq.Gate):
+    """
+    CNOT fan-out: the first qubit controls an X gate on each of the other qubits
+    """
+
+    def __init__(self, num_targets):
+        if num_targets < 1:
+            raise ValueError("A fan-out gate needs at least one target qubit")
+        self.num_targets = num_targets
+
+    def _num_qubits_(self):
+        return self.num_targets + 1
+
+    def _unitary_(self):
+        return fan_out_unitary(self.num_targets)
+
+    def _apply_unitary_(self, args):
+        # permute the amplitudes in the control = 1 half of the state instead of multiplying by the dense unitary
+        control_axis = args.axes[0]
+        target_axes = [axis - (axis > control_axis) for axis in args.axes[1:]]
+        index = [slice(None)] * args.target_tensor.ndim
+        index[control_axis] = 1
+        index = tuple(index)
+        args.available_buffer[index] = args.target_tensor[index]
+        args.target_tensor[index] = np.flip(args.available_buffer[index], axis=target_axes)
+        return args.target_tensor
+
+    def _decompose_(self, qubits):
+        control = qubits[0]
+        return [cirq.CNOT(control, target) for target in qubits[1:]]
+
+    def _circuit_diagram_info_(self, args):
+        return ("@",) + ("X",) * self.num_targets
+
+    def _value_equality_values_(self):
+        return self.num_targets
+
+    def __repr__(self):
+        return f"optimizing_circuit.customGate.CXn(num_targets={self.num_targets})"
+
+    @classmethod
+    def _json_namespace_(cls):
+        return 'optimizing_circuit'
+
+    def _json_dict_(self):
+        return cirq.obj_to_dict_helper(self, ['num_targets'])
+
+
+class CXX(CXn):
+    def __init__(self):
+        super(CXX, self).__init__(2)
+
+    def __repr__(self):
+        return "optimizing_circuit.customGate.CXX()"
+
+    def _json_dict_(self):
+        return cirq.obj_to_dict_helper(self, [])
+
+
+class CXXX(CXn):
+    def __init__(self):
+        super(CXXX, self).__init__(3)
+
+    def __repr__(self):
+        return "optimizing_circuit.customGate.CXXX()"
+
+    def _json_dict_(self):
+        return cirq.obj_to_dict_helper(self, [])
+
+
+def fan_out(num_targets):
+    """
+    :param num_targets: number of target qubits
+    :return: the CNOT fan-out gate, CXX or CXXX for two or three targets so that they keep their names
+    """
+    if num_targets == 2:
+        return CXX()
+    if num_targets == 3:
+        return CXXX()
+    return CXn(num_targets)
+
+
+def custom_gate_resolver(cirq_type):
+    """
+    Resolver for cirq.read_json so that circuits containing the custom gates can be deserialized
+    :param cirq_type: the cirq_type field of a serialized object
+    :return: the custom gate class, or None for any other type
+    """
+    return {'optimizing_circuit.CXn': CXn, 'optimizing_circuit.CXX': CXX,
+            'optimizing_circuit.CXXX': CXXX}.get(cirq_type)
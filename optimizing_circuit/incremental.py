@@ -0,0 +1,94 @@
+from .circuitDag import CircuitDag, run_rules, template_rules
+
+
+class IncrementalOptimizer:
+    """
+    Keep the optimized form of a circuit that is edited a few gates at a time. The circuit is held as a CircuitDag,
+    whose per-qubit links play the role of the pending gates of transformer.py, and after each edit the templates
+    are only matched again around the edited operations
+    """
+
+    def __init__(self, circuit, templates='abcdf', cost_model=None):
+        """
+        :param circuit: the starting circuit, optimized once entirely
+        :param templates: characters of the templates to apply, in order of priority
+        :param cost_model: optional costModel.CostModel, a rewrite is then only applied when it lowers the cost
+        """
+        self.rules = template_rules(templates)
+        self.dag = CircuitDag(circuit)
+        if cost_model is not None:
+            self.dag.accept = cost_model.lowers_cost
+        # seqs of the operations appended at the end, after all the operations of the starting circuit
+        self.next_index = len(self.dag.nodes)
+        run_rules(self.dag, self.rules, self.dag.nodes)
+
+    def nodes(self):
+        """
+        :return: the live nodes in circuit order. A node is the handle of an operation for the edits, and stays valid
+        until the operation is deleted, replaced or optimized away
+        """
+        live = [node for node in self.dag.nodes if node.alive]
+        live.sort(key=lambda node: node.seq)
+        # forget the dead nodes while the list is rebuilt anyway
+        self.dag.nodes = list(live)
+        return live
+
+    def circuit(self):
+        """
+        :return: the optimized circuit
+        """
+        return self.dag.to_circuit()
+
+    def insert(self, op, after=None):
+        """
+        Insert an operation and optimize around it
+        :param op: operation to insert
+        :param after: node after which the operation is inserted, None to append it at the end
+        :return: the node of the operation, which may already be optimized away
+        """
+        if after is None:
+            seq = (self.next_index,)
+            self.next_index += 1
+        else:
+            self._check(after)
+            # the latest insertion after a node comes right after it
+            seq = self.dag.seqs_after(after.seq, 1)[0]
+        node = self.dag.insert(op, seq, after)
+        self._optimize_around([node])
+        return node
+
+    def delete(self, node):
+        """
+        Delete an operation and optimize around it
+        :param node: node of the operation
+        """
+        self._check(node)
+        self._optimize_around(self.dag.replace([node], [], node.seq))
+
+    def replace(self, node, op):
+        """
+        Replace an operation by another one, which may act on other qubits, and optimize around it
+        :param node: node of the operation to replace
+        :param op: the new operation
+        :return: the node of the new operation, which may already be optimized away
+        """
+        self._check(node)
+        new_node = self.dag.insert(op, self.dag.seqs_after(node.seq, 1)[0], node)
+        touched = self.dag.replace([node], [], node.seq)
+        self._optimize_around([new_node] + touched)
+        return new_node
+
+    def _optimize_around(self, nodes):
+        # the node and its neighbours on each qubit are the only places where a template can newly match
+        worklist = []
+        for node in nodes:
+            if node.alive:
+                worklist.append(node)
+                worklist.extend(prev for prev in node.prev.values() if prev is not None)
+                worklist.extend(nxt for nxt in node.next.values() if nxt is not None)
+        run_rules(self.dag, self.rules, worklist)
+
+    @staticmethod
+    def _check(node):
+        if not node.alive:
+            raise ValueError("The operation was deleted or optimized away")
@@ -0,0 +1,70 @@
+import functools
+import logging
+import time
+from collections import namedtuple
+
+
+# one run of an instrumented pass. matches is the number of template matches, or a dictionary of them per template
+# for passes applying several templates. pending_high_water is the largest number of gates held back at once, None
+# for passes which hold none
+PassEvent = namedtuple('PassEvent', ['name', 'seconds', 'ops_in', 'ops_out', 'matches', 'pending_high_water'])
+
+_hooks = []
+
+
+def add_hook(callback):
+    """
+    Call the callback with a PassEvent after every run of an instrumented pass. Without any hook the passes run
+    without instrumentation
+    :param callback: function taking a PassEvent
+    """
+    _hooks.append(callback)
+
+
+def remove_hook(callback):
+    _hooks.remove(callback)
+
+
+def logging_hook(logger=None, level=logging.INFO):
+    """
+    :param logger: logger to write to, the logger of this module by default
+    :param level: level of the records
+    :return: a hook writing one record per pass, to give to add_hook
+    """
+    logger = logger or logging.getLogger(__name__)
+
+    def hook(event):
+        logger.log(level, "%s: %.6f s, %d -> %d ops, matches %s, pending high-water %s", event.name, event.seconds,
+                   event.ops_in, event.ops_out, event.matches, event.pending_high_water)
+    return hook
+
+
+def _num_ops(circuit):
+    return sum(1 for _ in circuit.all_operations())
+
+
+def instrumented(name):
+    """
+    Decorator of a pass taking a circuit and returning the new circuit. When a hook is set, the pass is called with a
+    stats dictionary to fill with the keys matches and pending_high_water, and a PassEvent is sent to the hooks
+    :param name: name of the pass in the events
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(circuit, *args, **kwargs):
+            if not _hooks:
+                return function(circuit, *args, **kwargs)
+            # the caller may pass its own stats dictionary, it is filled as well
+            stats = kwargs.pop('stats', None)
+            if stats is None:
+                stats = {}
+            start = time.perf_counter()
+            result = function(circuit, *args, stats=stats, **kwargs)
+            seconds = time.perf_counter() - start
+            event = PassEvent(name, seconds, _num_ops(circuit), _num_ops(result), stats.get('matches'),
+                              stats.get('pending_high_water'))
+            for hook in list(_hooks):
+                hook(event)
+            return result
+        return wrapper
+    return decorate
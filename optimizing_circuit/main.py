@@ -1,7 +1,8 @@
-from transformer import *
-from randomCircuit import *
-from testing import *
-from cirq import *
+from cirq import LineQubit
+
+from .randomCircuit import generate_random_circuit
+from .testing import assert_equivalent
+from .transformer import merge_flip_cnot
 
 
 if __name__ == '__main__':
@@ -16,5 +17,6 @@ if __name__ == '__main__':
     print("Origin circuit:\n", origin)
     opt = merge_flip_cnot(origin)
     print("Optimized circuit:\n", opt)
-    simulator_test(origin, opt)
+    assert_equivalent(origin, opt)
+    print("Optimized circuit is equivalent to the origin circuit")
 
@@ -0,0 +1,264 @@
+import functools
+import hashlib
+import os
+import sys
+
+import numpy as np
+from cirq import CNOT, CZ, SWAP, Circuit, H, LineQubit, S, X, Y, Z, has_unitary
+
+from .customGate import CXX
+from .instrumentation import instrumented
+
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'peephole_table.npz')
+
+_SINGLE_QUBIT_GATES = [X, Y, Z, H, S, S ** -1]
+
+# gates the table entries are written with, as (gate, positions of its qubits in the window), per window size
+GENERATORS = {
+    1: [(gate, (0,)) for gate in _SINGLE_QUBIT_GATES],
+    2: [(gate, (q,)) for q in range(2) for gate in _SINGLE_QUBIT_GATES]
+       + [(CNOT, (0, 1)), (CNOT, (1, 0)), (CZ, (0, 1)), (SWAP, (0, 1))],
+    3: [(H, (q,)) for q in range(3)]
+       + [(CNOT, (c, t)) for c in range(3) for t in range(3) if c != t]
+       + [(CXX(), (c,) + tuple(t for t in range(3) if t != c)) for c in range(3)],
+}
+
+# longest sequence searched when building each table. The one and two qubit Clifford groups are enumerated entirely,
+# the three qubit table only holds the short H, CNOT and CXX sequences
+MAX_LENGTH = {1: 10, 2: 20, 3: 4}
+
+
+def unitary_key(unitary):
+    """
+    Key of a unitary up to global phase: the phase of the first non-zero entry is removed, the entries are rounded to
+    6 decimals and hashed
+    :param unitary: a square matrix
+    :return: 16 bytes
+    """
+    flat = unitary.ravel()
+    pivot = flat[np.argmax(np.abs(flat) > 1e-6)]
+    normalized = flat * (abs(pivot) / pivot)
+    quantized = np.rint(np.concatenate([normalized.real, normalized.imag]) * 1e6).astype(np.int64) + 0
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def _embedded_unitary(gate, positions, num_qubits):
+    # unitary of the gate acting on the given positions of a window of num_qubits qubits
+    qubits = LineQubit.range(num_qubits)
+    return Circuit(gate.on(*[qubits[p] for p in positions])).unitary(qubit_order=qubits)
+
+
+def build_table(num_qubits, max_length=None):
+    """
+    Breadth-first search over the sequences of generators, keeping the first (so shortest) sequence reaching each
+    unitary
+    :param num_qubits: size of the windows, 1, 2 or 3
+    :param max_length: longest sequence to search, MAX_LENGTH by default
+    :return: dictionary from unitary key to tuple of generator indices
+    """
+    if max_length is None:
+        max_length = MAX_LENGTH[num_qubits]
+    matrices = [_embedded_unitary(gate, positions, num_qubits) for gate, positions in GENERATORS[num_qubits]]
+    identity = np.eye(2 ** num_qubits, dtype=complex)
+    table = {unitary_key(identity): ()}
+    frontier = [(identity, ())]
+    for _ in range(max_length):
+        next_frontier = []
+        for unitary, codes in frontier:
+            for index, matrix in enumerate(matrices):
+                product = matrix @ unitary
+                key = unitary_key(product)
+                if key not in table:
+                    table[key] = codes + (index,)
+                    next_frontier.append((product, table[key]))
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return table
+
+
+def _generator_names(num_qubits):
+    return np.array([f"{gate!r}@{positions}" for gate, positions in GENERATORS[num_qubits]])
+
+
+def save_tables(tables, path=TABLE_PATH):
+    """
+    Store the tables in a compressed npz file: per window size the keys as an (n, 16) byte array, and the sequences
+    as one flat array of generator indices with their offsets
+    :param tables: dictionary from window size to table as returned by build_table
+    :param path: file to write
+    """
+    arrays = {}
+    for num_qubits, table in tables.items():
+        sequences = list(table.values())
+        arrays[f'keys{num_qubits}'] = np.frombuffer(b''.join(table), dtype=np.uint8).reshape(-1, 16)
+        arrays[f'offsets{num_qubits}'] = np.cumsum([0] + [len(codes) for codes in sequences], dtype=np.int32)
+        arrays[f'codes{num_qubits}'] = np.fromiter((i for codes in sequences for i in codes), dtype=np.int8)
+        arrays[f'generators{num_qubits}'] = _generator_names(num_qubits)
+    np.savez_compressed(path, **arrays)
+
+
+def load_tables(path=TABLE_PATH):
+    """
+    :param path: file written by save_tables
+    :return: dictionary from window size to table, without the tables whose generators changed since the file was
+    written
+    """
+    tables = {}
+    with np.load(path) as data:
+        for num_qubits in GENERATORS:
+            if f'keys{num_qubits}' not in data:
+                continue
+            if not np.array_equal(data[f'generators{num_qubits}'], _generator_names(num_qubits)):
+                continue
+            keys = data[f'keys{num_qubits}']
+            offsets = data[f'offsets{num_qubits}'].tolist()
+            codes = data[f'codes{num_qubits}'].tolist()
+            tables[num_qubits] = {keys[i].tobytes(): tuple(codes[offsets[i]:offsets[i + 1]])
+                                  for i in range(len(keys))}
+    return tables
+
+
+_tables = None
+
+
+def get_table(num_qubits):
+    """
+    Table of a window size. The file is only read on the first call, and the tables are built and written to it when
+    it is missing or out of date
+    :param num_qubits: size of the windows, 1, 2 or 3
+    :return: dictionary from unitary key to tuple of generator indices
+    """
+    global _tables
+    if _tables is None:
+        _tables = load_tables() if os.path.exists(TABLE_PATH) else {}
+        if len(_tables) < len(GENERATORS):
+            for size in GENERATORS:
+                if size not in _tables:
+                    _tables[size] = build_table(size)
+            try:
+                save_tables(_tables)
+            except OSError:
+                pass
+    return _tables[num_qubits]
+
+
+@functools.lru_cache(maxsize=None)
+def _is_table_gate(gate):
+    # gates a window may hold: their own unitary is reachable in the table of their size
+    num_qubits = gate.num_qubits()
+    if num_qubits > 3 or not has_unitary(gate):
+        return False
+    return unitary_key(_embedded_unitary(gate, tuple(range(num_qubits)), num_qubits)) in get_table(num_qubits)
+
+
+def _replacement(ops):
+    # cheaper sequence for the operations, or None
+    qubits = sorted({qubit for op in ops for qubit in op.qubits})
+    position = {qubit: i for i, qubit in enumerate(qubits)}
+    unitary = np.eye(2 ** len(qubits), dtype=complex)
+    for op in ops:
+        unitary = _embedded_unitary(op.gate, tuple(position[q] for q in op.qubits), len(qubits)) @ unitary
+    codes = get_table(len(qubits)).get(unitary_key(unitary))
+    if codes is None or len(codes) >= len(ops):
+        return None
+    generators = GENERATORS[len(qubits)]
+    return [generators[i][0].on(*[qubits[p] for p in generators[i][1]]) for i in codes]
+
+
+def _windows(ops, max_qubits):
+    # group the operations into convex windows of at most max_qubits qubits. A window is closed as soon as one of its
+    # qubits is used by an operation which does not join it, so no other operation acts on its qubits between its
+    # first and last operation
+    windows = []
+    open_windows = {}
+
+    def close(window):
+        for qubit in window[0]:
+            del open_windows[qubit]
+        if len(window[1]) > 1:
+            windows.append(window[1])
+
+    for i, op in enumerate(ops):
+        touched = {id(open_windows[q]): open_windows[q] for q in op.qubits if q in open_windows}.values()
+        if op.gate is None or not _is_table_gate(op.gate):
+            for window in list(touched):
+                close(window)
+            continue
+        qubits = set(op.qubits).union(*(window[0] for window in touched))
+        if len(qubits) > max_qubits:
+            for window in list(touched):
+                close(window)
+            qubits = set(op.qubits)
+            indices = [i]
+        else:
+            indices = sorted([index for window in touched for index in window[1]] + [i])
+            for window in list(touched):
+                for qubit in window[0]:
+                    del open_windows[qubit]
+        window = (qubits, indices)
+        for qubit in qubits:
+            open_windows[qubit] = window
+    for window in {id(window): window for window in open_windows.values()}.values():
+        if len(window[1]) > 1:
+            windows.append(window[1])
+    return windows
+
+
+@instrumented('peephole')
+def peephole_optimize(circuit, max_qubits=2, max_window=8, stats=None):
+    """
+    Slide over the circuit in windows of connected operations on at most max_qubits qubits, and replace each window,
+    or else each run of at most max_window operations inside it, by the shortest equivalent sequence of the tables
+    :param circuit: a circuit to optimize
+    :param max_qubits: largest window, 1, 2 or 3. Windows of 3 qubits can use the CXX gate
+    :param max_window: longest run tried inside a window whose whole unitary is not in the tables
+    :param stats: optional dictionary filled with the number of replaced runs
+    :return: new circuit
+    """
+    if max_qubits not in GENERATORS:
+        raise ValueError(f"Windows hold 1, 2 or 3 qubits, not {max_qubits}")
+    ops = list(circuit.all_operations())
+    # index of the last operation of a replaced run -> new operations, the other operations of the run are dropped
+    new_ops = {}
+    dropped = set()
+
+    for window in _windows(ops, max_qubits):
+        new = _replacement([ops[i] for i in window])
+        if new is None:
+            runs = []
+            start = 0
+            while start < len(window) - 1:
+                # the longest run from this start which has a cheaper form
+                for end in range(min(len(window), start + max_window), start + 1, -1):
+                    new = _replacement([ops[i] for i in window[start:end]])
+                    if new is not None:
+                        runs.append((start, end, new))
+                        start = end
+                        break
+                else:
+                    start += 1
+        else:
+            runs = [(0, len(window), new)]
+        for start, end, new in runs:
+            dropped.update(window[start:end - 1])
+            new_ops[window[end - 1]] = new
+
+    if stats is not None:
+        stats.update(matches=len(new_ops))
+    result = []
+    for i, op in enumerate(ops):
+        if i in new_ops:
+            result.extend(new_ops[i])
+        elif i not in dropped:
+            result.append(op)
+    return Circuit(result)
+
+
+if __name__ == '__main__':
+    # build the tables offline: python -m optimizing_circuit.peephole [path]
+    path = sys.argv[1] if len(sys.argv) > 1 else TABLE_PATH
+    save_tables({size: build_table(size) for size in GENERATORS}, path)
+    print(f"Wrote {path}")
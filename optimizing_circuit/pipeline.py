@@ -0,0 +1,147 @@
+import time
+from collections import namedtuple
+
+from cirq import CXPowGate, HPowGate
+
+from .compactCircuit import COMPACT_TRANSFORMERS, OP_CNOT, OP_H, CompactCircuit
+from .transformer import TRANSFORMERS
+
+
+# one run (or skip) of a transformer inside optimize
+PassRecord = namedtuple('PassRecord', ['round', 'template', 'seconds', 'ops_before', 'ops_after',
+                                       'depth_before', 'depth_after', 'skipped'])
+
+OptimizationResult = namedtuple('OptimizationResult', ['circuit', 'records', 'rounds'])
+
+
+def circuit_cost(circuit):
+    """
+    Cost used to compare circuits: number of operations first, then depth
+    :param circuit: a circuit
+    :return: tuple (number of operations, depth)
+    """
+    return sum(1 for _ in circuit.all_operations()), len(circuit)
+
+
+def _gate_counts(circuit):
+    num_h = 0
+    num_cnot = 0
+    for op in circuit.all_operations():
+        if isinstance(op.gate, HPowGate):
+            num_h += 1
+        elif isinstance(op.gate, CXPowGate):
+            num_cnot += 1
+    return num_h, num_cnot
+
+
+def _compact_gate_counts(compact):
+    return int((compact.opcode == OP_H).sum()), int((compact.opcode == OP_CNOT).sum())
+
+
+def _can_match(template, num_h, num_cnot):
+    # the minimum number of H and CNOT gates each template needs to match at least once
+    match template:
+        case 'a':
+            return num_cnot >= 2 and num_h >= 4
+        case 'b':
+            return num_h >= 2
+        case 'c' | 'd':
+            return num_cnot >= 2
+        case 'e':
+            return num_cnot >= 1
+        case 'f':
+            return num_cnot >= 1 and num_h >= 4
+    return False
+
+
+def optimize(circuit, passes='fbcd', max_rounds=10, time_budget=None, cost_model=None, compact=False):
+    """
+    Rerun the transformers until the circuit stops improving. A pass is skipped when the circuit has too few H or CNOT
+    gates for its template, or when it already ran without effect on the same circuit. After each round the passes
+    are reordered so the ones which removed the most gates run first.
+    Template e adds gates on its own and template a trades CNOT gates for fan-out gates, so they are not in the
+    default passes
+    :param circuit: a circuit to optimize
+    :param passes: characters of the templates to apply in each round
+    :param max_rounds: maximum number of rounds over all passes
+    :param time_budget: seconds after which no new pass is started, None for no limit
+    :param cost_model: optional costModel.CostModel. The cost of the model then replaces circuit_cost, and the result
+    of a pass is only kept when it lowers that cost
+    :param compact: run the passes of compactCircuit on the array form of the circuit, converted once before the
+    first pass and once at the end
+    :return: OptimizationResult with the cheapest circuit found, a PassRecord per pass and the number of rounds
+    """
+    for template in passes:
+        if template not in TRANSFORMERS:
+            raise ValueError(f"Undefined template {template!r}. Choose template a, b, c, d, e, f")
+
+    start = time.perf_counter()
+    records = []
+    order = list(passes)
+    if compact:
+        transformers, measure, gate_counts = COMPACT_TRANSFORMERS, CompactCircuit.cost, _compact_gate_counts
+        current = CompactCircuit.from_circuit(circuit)
+    else:
+        transformers, measure, gate_counts = TRANSFORMERS, circuit_cost, _gate_counts
+        current = circuit
+    initial = current
+
+    def model_cost(state):
+        return cost_model.cost(state.to_circuit() if compact else state)
+
+    def result():
+        # the input circuit itself when no pass improved it
+        optimized = circuit if best is initial else best.to_circuit() if compact else best
+        return OptimizationResult(optimized, records, rounds)
+
+    current_counts = measure(current)
+    current_cost = current_counts if cost_model is None else model_cost(current)
+    best, best_cost = current, current_cost
+    # number of the circuit version each pass last left unchanged, rerunning it on that version cannot help
+    version = 0
+    idle_at = {}
+    rounds = 0
+
+    for round_index in range(max_rounds):
+        round_start_cost = current_cost
+        gains = {}
+        for template in order:
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                return result()
+            ops, depth = current_counts
+
+            if idle_at.get(template) == version:
+                records.append(PassRecord(round_index, template, 0.0, ops, ops, depth, depth, 'unchanged'))
+                continue
+            if not _can_match(template, *gate_counts(current)):
+                idle_at[template] = version
+                records.append(PassRecord(round_index, template, 0.0, ops, ops, depth, depth, 'no match'))
+                continue
+
+            pass_start = time.perf_counter()
+            new_circuit = transformers[template](current)
+            elapsed = time.perf_counter() - pass_start
+            new_ops, new_depth = measure(new_circuit)
+            records.append(PassRecord(round_index, template, elapsed, ops, new_ops, depth, new_depth, None))
+            if cost_model is None:
+                new_cost = new_ops, new_depth
+                gains[template] = ops - new_ops
+            else:
+                new_cost = model_cost(new_circuit)
+                gains[template] = current_cost - new_cost
+
+            # with a cost model, a pass which does not lower the cost is not kept
+            if new_circuit == current or (cost_model is not None and new_cost >= current_cost):
+                idle_at[template] = version
+                continue
+            version += 1
+            current, current_cost, current_counts = new_circuit, new_cost, (new_ops, new_depth)
+            if current_cost < best_cost:
+                best, best_cost = current, current_cost
+
+        rounds += 1
+        if current_cost >= round_start_cost:
+            break
+        order.sort(key=lambda t: -gains.get(t, 0))
+
+    return result()
@@ -0,0 +1,229 @@
+import random
+
+import numpy as np
+from cirq import CNOT, CZ, ISWAP, SWAP, XX, YY, ZZ, Circuit, H, S, T, X, Y, Z
+
+
+# all common gates in cirq, the first six act on one qubit and the others on two qubits
+GATES = [X, Y, Z, H, S, T, CZ, CNOT, SWAP, ISWAP, XX, YY, ZZ]
+NUM_SINGLE_QUBIT_GATES = 6
+
+
+def generate_random_circuit(qubits, depth, template):
+    """
+    Generate random quantum circuit which has chosen template identity appeared at least once
+    :param qubits: list of qubits to apply on the circuit
+    :param depth: maximum number of gates
+    :param template: a character to define which template
+    :return: New quantum circuit
+    """
+    circuit = Circuit()
+    gates = GATES
+    # randomly chose the qubit to apply operation
+    control = random.choice(qubits)
+    template_added = False
+    operations = []
+    i = 0
+    while i < depth:
+        template_new = generate_template(qubits, depth, template)
+        if depth == len(template_new):
+            operations.extend(template_new)
+            break
+
+        num = random.randint(0, len(gates))
+        if num == len(gates):
+            gate = template_new
+        else:
+            gate = gates[num]
+
+        if gate in gates[6:]:
+            target = random.choice(qubits)
+            while control == target:
+                target = random.choice(qubits)
+            operations.append(gate(control, target))
+        elif gate == template_new:
+            operations.extend(template_new)
+            template_added = True
+        else:
+            operations.append(gate(control))
+
+        i = len(operations)
+
+        if depth - i == len(template_new) and not template_added:
+            operations.extend(template_new)
+            template_added = True
+            i = len(operations)
+    circuit.append(operations)
+    return circuit
+
+
+def generate_template(qubits, depth, template):
+
+    control = random.choice(qubits)
+
+    match template:
+        case 'a':
+            # not yet finished
+            if len(qubits) < 4 or depth < 9:
+                print("To use template a, you should have at least 4 qubits")
+                return
+            target = random.choice(qubits)
+            control2 = random.choice(qubits)
+            control3 = random.choice(qubits)
+            while control2 == control or control2 == control3 or control == control3  \
+                    or control2 == target or control3 == target or control == target:
+                target = random.choice(qubits)
+                control2 = random.choice(qubits)
+                control3 = random.choice(qubits)
+            template_generated = [H(control), H(control2), H(control3), CNOT(control, target), CNOT(control2, target),
+                                  CNOT(control3, target), H(control), H(control2), H(control3)]
+            return template_generated
+
+        case 'b':
+            if len(qubits) < 1 or depth < 2:
+                print("To use template b, you should have at least 1 qubits")
+                return
+            template_generated = [H(control), H(control)]
+            return template_generated
+
+        case 'c':
+            if len(qubits) < 2 or depth < 2:
+                print("To use template c, you should have at least 2 qubits")
+                return
+            target = random.choice(qubits)
+            while target == control:
+                target = random.choice(qubits)
+            template_generated = [CNOT(control, target), CNOT(control, target)]
+            return template_generated
+
+        case 'd':
+            if len(qubits) < 3 or depth < 2:
+                print("To use template d, you should have at least 3 qubits")
+                return
+            target1 = random.choice(qubits)
+            target2 = random.choice(qubits)
+            while target2 == target1 or target2 == control or target1 == control:
+                target1 = random.choice(qubits)
+                target2 = random.choice(qubits)
+            template_generated = [CNOT(control, target1), CNOT(control, target2)]
+            return template_generated
+
+        case 'e':
+            if len(qubits) < 2 or depth < 1:
+                print("To use template e, you should have at least 2 qubits")
+                return
+            target = random.choice(qubits)
+            while target == control:
+                target = random.choice(qubits)
+            template_generated = [CNOT(control, target)]
+            return template_generated
+
+        case 'f':
+            if len(qubits) < 2 or depth < 5:
+                print("To use template f, you should have at least 2 qubits")
+                return
+            target = random.choice(qubits)
+            while target == control:
+                target = random.choice(qubits)
+            template_generated = [H(control), H(target), CNOT(control, target), H(control), H(target)]
+            return template_generated
+        case _:
+            print("Undefined template. Choose template a, b, c, d, e, f")
+            return
+
+
+# templates as rows (gate index in GATES, role of the first qubit, role of the second qubit or -1), where the roles
+# are distinct qubits drawn for each circuit
+_H = GATES.index(H)
+_CNOT = GATES.index(CNOT)
+TEMPLATE_PATTERNS = {
+    'a': [(_H, 0, -1), (_H, 1, -1), (_H, 2, -1), (_CNOT, 0, 3), (_CNOT, 1, 3), (_CNOT, 2, 3),
+          (_H, 0, -1), (_H, 1, -1), (_H, 2, -1)],
+    'b': [(_H, 0, -1), (_H, 0, -1)],
+    'c': [(_CNOT, 0, 1), (_CNOT, 0, 1)],
+    'd': [(_CNOT, 0, 1), (_CNOT, 0, 2)],
+    'e': [(_CNOT, 0, 1)],
+    'f': [(_H, 0, -1), (_H, 1, -1), (_CNOT, 0, 1), (_H, 0, -1), (_H, 1, -1)],
+}
+
+
+# bound on the entries of each array drawn for a batch, 8 MB of int64
+BATCH_ELEMENTS = 1 << 20
+
+
+def generate_random_circuits(num_circuits, qubits, depth, template=None, seed=None, batch_size=None,
+                             as_arrays=False):
+    """
+    Generate random quantum circuits in batches: the gates, qubits and template positions of a whole batch are drawn
+    at once with NumPy, and the circuits are yielded one by one. The same arguments give the same circuits
+    :param num_circuits: number of circuits to generate
+    :param qubits: list of qubits to apply on the circuits
+    :param depth: number of gates of each circuit
+    :param template: a character to define which template is inserted once in each circuit, None for no template
+    :param seed: seed or numpy.random.Generator
+    :param batch_size: number of circuits drawn at once, None for at most 1024 circuits and BATCH_ELEMENTS entries
+    per array
+    :param as_arrays: yield tuples (gate indices in GATES, first qubit indices, second qubit indices or -1) instead of
+    circuits
+    :return: generator of circuits
+    """
+    num_qubits = len(qubits)
+    pattern = np.array(TEMPLATE_PATTERNS[template] if template is not None else [], dtype=np.int64).reshape(-1, 3)
+    num_roles = int(pattern[:, 1:].max()) + 1 if len(pattern) else 0
+    if num_qubits < max(2, num_roles):
+        raise ValueError(f"Template {template} needs at least {max(2, num_roles)} qubits")
+    if depth < len(pattern):
+        raise ValueError(f"Template {template} needs a depth of at least {len(pattern)}")
+
+    if batch_size is None:
+        batch_size = max(1, min(1024, BATCH_ELEMENTS // max(depth, num_qubits)))
+    rng = np.random.default_rng(seed)
+    # operations already built, shared between circuits since cirq operations are immutable
+    op_cache = {}
+    done = 0
+    while done < num_circuits:
+        size = min(batch_size, num_circuits - done)
+        codes = rng.integers(0, len(GATES), size=(size, depth))
+        first = rng.integers(0, num_qubits, size=(size, depth))
+        # a second qubit different from the first one
+        second = (first + rng.integers(1, num_qubits, size=(size, depth))) % num_qubits
+        second[codes < NUM_SINGLE_QUBIT_GATES] = -1
+
+        if len(pattern):
+            rows = np.arange(size)[:, None]
+            columns = rng.integers(0, depth - len(pattern) + 1, size=size)[:, None] + np.arange(len(pattern))
+            # distinct qubits for the roles of the template in each circuit
+            roles = rng.random((size, num_qubits)).argsort(axis=1)[:, :num_roles]
+            codes[rows, columns] = pattern[:, 0]
+            first[rows, columns] = roles[:, pattern[:, 1]]
+            second[rows, columns] = np.where(pattern[:, 2] >= 0, roles[:, np.maximum(pattern[:, 2], 0)], -1)
+
+        for i in range(size):
+            if as_arrays:
+                yield codes[i], first[i], second[i]
+            else:
+                yield arrays_to_circuit(codes[i], first[i], second[i], qubits, op_cache)
+        done += size
+
+
+def arrays_to_circuit(codes, first, second, qubits, op_cache=None):
+    """
+    Build the circuit described by index arrays in one construction
+    :param codes: gate indices in GATES
+    :param first: indices of the first qubit of each gate
+    :param second: indices of the second qubit of each gate, -1 for single qubit gates
+    :param qubits: list of qubits the indices refer to
+    :param op_cache: optional dictionary reusing operations between calls
+    :return: New quantum circuit
+    """
+    if op_cache is None:
+        op_cache = {}
+    operations = []
+    for key in zip(codes.tolist(), first.tolist(), second.tolist()):
+        op = op_cache.get(key)
+        if op is None:
+            code, q0, q1 = key
+            op = GATES[code](qubits[q0]) if q1 < 0 else GATES[code](qubits[q0], qubits[q1])
+            op_cache[key] = op
+        operations.append(op)
+    return Circuit(operations)
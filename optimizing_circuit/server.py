@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from .cli import FORMATS, optimize_text, sniff_format
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           503: 'Service Unavailable'}
+
+
+class ServerBusy(Exception):
+    """
+    Raised when the queue of the server is full, the client should retry later
+    """
+
+
+def _percentile(ordered, q):
+    # nearest-rank percentile of a sorted list
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+class OptimizationServer:
+    """
+    Optimize circuits for clients over HTTP on a TCP or Unix socket. The optimization runs in a pool of processes,
+    identical requests in flight share one optimization, and requests beyond the queue size are refused instead of
+    waiting without bound
+    """
+
+    def __init__(self, workers=None, max_queue=64, passes='fbcd', max_rounds=10, max_body=16 * 2 ** 20,
+                 latency_window=10000):
+        """
+        :param workers: number of processes, all cores by default
+        :param max_queue: most optimizations queued or running at once, more are answered with 503
+        :param passes: default characters of the templates given to pipeline.optimize
+        :param max_rounds: default maximum number of rounds given to pipeline.optimize
+        :param max_body: largest request body in bytes
+        :param latency_window: number of latest requests the latency percentiles are computed on
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.passes = passes
+        self.max_rounds = max_rounds
+        self.max_body = max_body
+        self.executor = None
+        # key of the request -> task of its optimization, shared by identical requests
+        self.in_flight = {}
+        self.running = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.counters = {'requests': 0, 'completed': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0}
+        self._slots = None
+
+    def _start_executor(self):
+        if self.executor is None:
+            # import the optimizer once here, so workers forked from this process start with it loaded. This only
+            # helps with the fork start method, spawned workers import it themselves
+            from . import pipeline  # noqa: F401
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def optimize(self, text, fmt=None, passes=None, max_rounds=None, output_format=None):
+        """
+        :param text: the circuit in the given format
+        :param fmt: 'qasm', 'jsonl' or 'json', guessed from the text by default
+        :param passes: characters of the templates, the default of the server when None
+        :param max_rounds: maximum number of rounds, the default of the server when None
+        :param output_format: format of the optimized circuit, the input format by default
+        :return: tuple (text of the optimized circuit, summary dictionary of cli.optimize_text, True if the request
+        shared the optimization of an identical one)
+        """
+        fmt = fmt or sniff_format(text)
+        passes = passes or self.passes
+        undefined = set(passes) - set('abcdef')
+        if undefined:
+            raise ValueError(f"undefined templates {''.join(sorted(undefined))}. Choose template a, b, c, d, e, f")
+        max_rounds = max_rounds or self.max_rounds
+        key = hashlib.blake2b(json.dumps([fmt, passes, max_rounds, output_format, text]).encode(),
+                              digest_size=16).digest()
+        task = self.in_flight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.counters['coalesced'] += 1
+        else:
+            if len(self.in_flight) >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise ServerBusy(f"{len(self.in_flight)} optimizations in flight")
+            self._start_executor()
+            task = asyncio.ensure_future(self._run(text, fmt, passes, max_rounds, output_format))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # a client going away does not cancel the optimization other clients wait for
+        result, summary = await asyncio.shield(task)
+        return result, summary, coalesced
+
+    async def _run(self, text, fmt, passes, max_rounds, output_format):
+        async with self._slots:
+            self.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, optimize_text, text, fmt, passes, max_rounds, output_format)
+            finally:
+                self.running -= 1
+
+    def stats(self):
+        """
+        :return: dictionary with the counters, the queue depth (optimizations waiting for a process), the number of
+        running optimizations and the latency percentiles in ms of the latest requests
+        """
+        ordered = sorted(self.latencies)
+        latency = {f'p{q}': None if not ordered else round(_percentile(ordered, q) * 1000, 3) for q in (50, 90, 99)}
+        latency['max'] = round(ordered[-1] * 1000, 3) if ordered else None
+        return dict(self.counters, queue_depth=len(self.in_flight) - self.running, running=self.running,
+                    latency_ms=latency)
+
+    async def handle(self, method, target, body=b''):
+        """
+        Answer one request, without any transport. POST /optimize takes the circuit as body and the query parameters
+        format, passes, max_rounds and output_format, GET /stats and GET /health take nothing
+        :param method: HTTP method
+        :param target: path with the query string
+        :param body: request body
+        :return: tuple (HTTP status, JSON-serializable response, extra headers)
+        """
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok'}, {}
+        if url.path == '/stats':
+            return 200, self.stats(), {}
+        if url.path != '/optimize':
+            return 404, {'error': f"no route {url.path}"}, {}
+        if method != 'POST':
+            return 405, {'error': "use POST"}, {'Allow': 'POST'}
+
+        self.counters['requests'] += 1
+        start = time.perf_counter()
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            fmt = query.get('format')
+            output_format = query.get('output_format')
+            for value in (fmt, output_format):
+                if value is not None and value not in FORMATS:
+                    raise ValueError(f"Undefined format {value!r}. Choose {', '.join(FORMATS)}")
+            max_rounds = int(query['max_rounds']) if 'max_rounds' in query else None
+            result, summary, coalesced = await self.optimize(body.decode(), fmt, query.get('passes'), max_rounds,
+                                                             output_format)
+        except ServerBusy as error:
+            return 503, {'error': str(error)}, {'Retry-After': '1'}
+        except Exception as error:
+            self.counters['errors'] += 1
+            return 400, {'error': f"{type(error).__name__}: {error}"}, {}
+        self.latencies.append(time.perf_counter() - start)
+        self.counters['completed'] += 1
+        return 200, {'circuit': result, 'summary': summary, 'coalesced': coalesced}, {}
+
+    async def _handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > self.max_body:
+                    status, payload, extra = 413, {'error': f"body larger than {self.max_body} bytes"}, {}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload, extra = await self.handle(method, target, body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} {REASONS[status]}", 'Content-Type: application/json',
+                        f"Content-Length: {len(data)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head.extend(f"{name}: {value}" for name, value in extra.items())
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8080, path=None):
+        """
+        :param host: address to listen on
+        :param port: TCP port, 0 for any free port
+        :param path: path of a Unix socket to listen on instead of TCP
+        :return: the asyncio server
+        """
+        self._start_executor()
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle_connection, path)
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+class InProcessClient:
+    """
+    Client calling an OptimizationServer in the same event loop without a socket, for tests and local use
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    async def optimize(self, text, fmt=None, passes=None, max_rounds=None, output_format=None):
+        """
+        :return: tuple (HTTP status, response dictionary)
+        """
+        query = {'format': fmt, 'passes': passes, 'max_rounds': max_rounds, 'output_format': output_format}
+        query = '&'.join(f"{name}={value}" for name, value in query.items() if value is not None)
+        status, payload, _ = await self.server.handle('POST', '/optimize?' + query, text.encode())
+        return status, payload
+
+    async def stats(self):
+        return (await self.server.handle('GET', '/stats'))[1]
+
+
+async def http_request(method, target, body=b'', host='127.0.0.1', port=8080, path=None):
+    """
+    Send one request to a running server over its socket
+    :param path: path of the Unix socket, None to connect over TCP
+    :return: tuple (HTTP status, response dictionary)
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    head = f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    writer.write(head.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    return int(status_line.split()[1]), json.loads(rest.partition(b'\r\n\r\n')[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve circuit optimization over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="processes, all cores by default")
+    parser.add_argument('--max-queue', type=int, default=64, help="most optimizations in flight before 503")
+    parser.add_argument('--passes', default='fbcd')
+    parser.add_argument('--max-rounds', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = OptimizationServer(args.workers, args.max_queue, args.passes, args.max_rounds)
+        listener = await server.start(args.host, args.port, args.unix)
+        print(f"Listening on {args.unix or f'{args.host}:{args.port}'}", file=sys.stderr)
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from .circuitIO import build_circuit, circuit_from_jsonl, circuit_to_jsonl
+from .pipeline import circuit_cost, optimize
+
+
+def qubit_groups(operations):
+    """
+    :param operations: operations of a circuit
+    :return: the sets of qubits which no operation connects with each other, as lists of operations in circuit order,
+    largest group first. The operations on no qubit, such as global phases, form a group of their own
+    """
+    parent = {}
+
+    def find(qubit):
+        while parent[qubit] != qubit:
+            parent[qubit] = parent[parent[qubit]]
+            qubit = parent[qubit]
+        return qubit
+
+    for op in operations:
+        if not op.qubits:
+            continue
+        for qubit in op.qubits:
+            parent.setdefault(qubit, qubit)
+        root = find(op.qubits[0])
+        for qubit in op.qubits[1:]:
+            other = find(qubit)
+            if other != root:
+                parent[other] = root
+
+    groups = {}
+    for op in operations:
+        groups.setdefault(find(op.qubits[0]) if op.qubits else None, []).append(op)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def time_slices(operations, num_slices):
+    """
+    :param operations: operations in circuit order
+    :param num_slices: number of slices
+    :return: the operations cut into num_slices consecutive lists of about the same length
+    """
+    num_slices = max(1, min(num_slices, len(operations)))
+    size, extra = divmod(len(operations), num_slices)
+    slices = []
+    start = 0
+    for i in range(num_slices):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(operations[start:end])
+        start = end
+    return slices
+
+
+def _tail(operations, qubits, width):
+    # indices of the last operations on the qubits, at most width per qubit. The set is closed under successors: an
+    # operation after one of the set on a common qubit is in the set too, so the set can be moved to the end
+    counts = {}
+    blocked = set()
+    chosen = []
+    for i in range(len(operations) - 1, -1, -1):
+        op_qubits = operations[i].qubits
+        if not blocked.isdisjoint(op_qubits) or \
+                not any(qubit in qubits and counts.get(qubit, 0) < width for qubit in op_qubits):
+            blocked.update(op_qubits)
+            continue
+        for qubit in op_qubits:
+            counts[qubit] = counts.get(qubit, 0) + 1
+        chosen.append(i)
+    chosen.reverse()
+    return chosen
+
+
+def _head(operations, qubits, width):
+    # the same as _tail at the start: the set is closed under predecessors, so it can be moved to the start
+    chosen = _tail(operations[::-1], qubits, width)
+    return [len(operations) - 1 - i for i in reversed(chosen)]
+
+
+def _optimize_ops(operations, passes, max_rounds):
+    if not operations:
+        return []
+    return list(optimize(build_circuit(operations), passes, max_rounds).circuit.all_operations())
+
+
+def stitch(left, right, passes='fbcd', max_rounds=10, width=16, max_width=1024):
+    """
+    Join two consecutive optimized parts of a circuit. The last operations of the left part and the first ones of the
+    right part on their common qubits are optimized again, which catches the matches straddling the boundary, such as
+    H-H pairs or H gates around a CNOT. A match can expose another one further from the boundary, so the window is
+    doubled until doubling it leaves the same operations, in any order, or reaches max_width. The window can be moved
+    after the rest of the left part and before the rest of the right part, so the result is always equivalent to the
+    two parts one after the other
+    :param left: optimized operations before the boundary
+    :param right: optimized operations after the boundary
+    :param passes: characters of the templates given to pipeline.optimize
+    :param max_rounds: maximum number of rounds given to pipeline.optimize
+    :param width: number of operations per qubit first taken on each side of the boundary
+    :param max_width: largest number of operations per qubit taken on each side of the boundary
+    :return: the operations of both parts
+    """
+    shared = {qubit for op in left for qubit in op.qubits} & {qubit for op in right for qubit in op.qubits}
+    if not shared:
+        return left + right
+    joined = None
+    remaining = None
+    while True:
+        tail = _tail(left, shared, width)
+        head = _head(right, shared, width)
+        in_tail = set(tail)
+        in_head = set(head)
+        window = [left[i] for i in tail] + [right[i] for i in head]
+        joined = ([op for i, op in enumerate(left) if i not in in_tail] + _optimize_ops(window, passes, max_rounds)
+                  + [op for i, op in enumerate(right) if i not in in_head])
+        # the optimized window orders commuting operations differently as it grows, so only the operations left are
+        # compared
+        previous, remaining = remaining, Counter(joined)
+        if remaining == previous or width >= max_width or (len(tail) == len(left) and len(head) == len(right)):
+            return joined
+        width *= 2
+
+
+def _optimize_shard(text, passes, max_rounds):
+    # runs in a worker process: shards travel as JSON lines both ways
+    return circuit_to_jsonl(optimize(circuit_from_jsonl(text), passes, max_rounds).circuit)
+
+
+def optimize_sharded(circuit, passes='fbcd', workers=None, min_shard_ops=2000, max_rounds=10, width=16,
+                     max_width=1024, stats=None):
+    """
+    Optimize one large circuit over a pool of processes. The circuit is split into groups of qubits that no operation
+    connects, which are optimized independently, and the groups are cut into time slices. The slices are optimized
+    in parallel and joined again with stitch.
+    The result is always equivalent to the circuit, with the default passes of pipeline.optimize as with any others.
+    With template b alone it is the same circuit as the serial pipeline.optimize: H-H cancellation ends in the same
+    circuit whatever order the pairs are found in. The other templates choose between overlapping matches, so a
+    slice may take near its boundary a match the serial run does not: the result may then order commuting gates
+    differently or differ from the serial one by a few gates
+    :param circuit: a circuit to optimize
+    :param passes: characters of the templates given to pipeline.optimize
+    :param workers: number of processes, all cores by default. With 1 the shards are optimized in this process
+    :param min_shard_ops: smallest number of operations of a time slice
+    :param max_rounds: maximum number of rounds given to pipeline.optimize
+    :param width: number of operations per qubit first optimized again on each side of a time slice boundary
+    :param max_width: largest number of operations per qubit optimized again on each side of a boundary
+    :param stats: optional dictionary filled with the keys groups, shards, ops_before, ops_after, seconds and
+    stitch_seconds
+    :return: new circuit
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    operations = list(circuit.all_operations())
+    groups = qubit_groups(operations)
+
+    # share the workers between the groups by their number of operations
+    shards = []
+    for index, group in enumerate(groups):
+        num_slices = min(max(1, round(workers * len(group) / max(1, len(operations)))),
+                         max(1, len(group) // min_shard_ops))
+        shards.extend((index, ops) for ops in time_slices(group, num_slices))
+
+    if workers == 1 or len(shards) == 1:
+        results = [_optimize_ops(ops, passes, max_rounds) for _, ops in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+            futures = [executor.submit(_optimize_shard, circuit_to_jsonl(build_circuit(ops)), passes, max_rounds)
+                       for _, ops in shards]
+            results = [list(circuit_from_jsonl(future.result()).all_operations()) for future in futures]
+
+    stitch_start = time.perf_counter()
+    joined = [[] for _ in groups]
+    for (index, _), ops in zip(shards, results):
+        joined[index] = stitch(joined[index], ops, passes, max_rounds, width, max_width) if joined[index] else ops
+    opt = build_circuit([op for ops in joined for op in ops])
+
+    if stats is not None:
+        stats.update(groups=len(groups), shards=len(shards), ops_before=len(operations),
+                     ops_after=circuit_cost(opt)[0], seconds=time.perf_counter() - start,
+                     stitch_seconds=time.perf_counter() - stitch_start)
+    return opt
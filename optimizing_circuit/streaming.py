@@ -0,0 +1,130 @@
+from cirq import Circuit, CNOT, H
+
+from .customGate import CXX
+
+
+def _flush(pending, qubits):
+    # yield the pending operations acting on the qubits and forget them on all their qubits
+    for qubit in qubits:
+        op = pending.get(qubit)
+        if op is not None:
+            for other in op.qubits:
+                del pending[other]
+            yield op
+
+
+def _flush_all(pending):
+    while pending:
+        yield from _flush(pending, [next(iter(pending))])
+
+
+def stream_cancel_adj_h(operations):
+    """
+    Apply the template b on a stream: a sequence of two Hadamard gates is cancelled. At most one H gate per qubit is
+    held back
+    :param operations: iterable of operations in circuit order
+    :return: generator of the optimized operations
+    """
+    pending = {}
+    for op in operations:
+        if op.gate == H:
+            qubit = op.qubits[0]
+            # a second H on the qubit cancels the pending one
+            if pending.pop(qubit, None) is None:
+                pending[qubit] = op
+            continue
+        yield from _flush(pending, op.qubits)
+        yield op
+    yield from _flush_all(pending)
+
+
+def stream_cancel_adj_cnot(operations):
+    """
+    Apply the template c on a stream: a sequence of two CNOT gates is cancelled. At most one CNOT per qubit is held
+    back
+    :param operations: iterable of operations in circuit order
+    :return: generator of the optimized operations
+    """
+    pending = {}
+    for op in operations:
+        if op.gate == CNOT:
+            control, target = op.qubits
+            pre_op = pending.get(control)
+            if pre_op is not None and pre_op is pending.get(target) and pre_op.qubits == op.qubits:
+                del pending[control]
+                del pending[target]
+                continue
+            yield from _flush(pending, op.qubits)
+            pending[control] = pending[target] = op
+            continue
+        yield from _flush(pending, op.qubits)
+        yield op
+    yield from _flush_all(pending)
+
+
+def stream_two_cx_to_cxx(operations):
+    """
+    Apply the template d on a stream: two CNOT gates following each other on the same control qubit transform to a
+    CXX gate. At most one CNOT per qubit is held back
+    :param operations: iterable of operations in circuit order
+    :return: generator of the optimized operations
+    """
+    pending = {}
+    for op in operations:
+        if op.gate == CNOT:
+            control, target = op.qubits
+            pre_op = pending.get(control)
+            if pre_op is not None and pre_op.qubits[0] == control and pre_op.qubits[1] != target:
+                pre_target = pre_op.qubits[1]
+                del pending[control]
+                del pending[pre_target]
+                yield from _flush(pending, [target])
+                yield CXX().on(control, pre_target, target)
+                continue
+            yield from _flush(pending, op.qubits)
+            pending[control] = pending[target] = op
+            continue
+        yield from _flush(pending, op.qubits)
+        yield op
+    yield from _flush_all(pending)
+
+
+def stream_flip_cnot(operations):
+    """
+    Apply the template e on a stream: flip every CNOT gate and surround it with H gates
+    :param operations: iterable of operations in circuit order
+    :return: generator of the operations
+    """
+    for op in operations:
+        if op.gate == CNOT:
+            q0, q1 = op.qubits
+            yield from (H(q0), H(q1), CNOT(q1, q0), H(q1), H(q0))
+        else:
+            yield op
+
+
+STREAM_PASSES = {'b': stream_cancel_adj_h, 'c': stream_cancel_adj_cnot, 'd': stream_two_cx_to_cxx,
+                 'e': stream_flip_cnot}
+
+
+def optimize_stream(operations, templates='bcd'):
+    """
+    Chain streaming passes: every operation flows through all of them without the whole circuit being held in memory
+    :param operations: iterable of operations in circuit order, for example read from a file
+    :param templates: characters of the templates to apply, in order, among b, c, d and e
+    :return: generator of the optimized operations
+    """
+    for template in templates:
+        if template not in STREAM_PASSES:
+            raise ValueError(f"Template {template!r} has no streaming pass. Choose template b, c, d, e")
+        operations = STREAM_PASSES[template](operations)
+    return operations
+
+
+def optimize_circuit_stream(circuit, templates='bcd'):
+    """
+    :param circuit: a circuit to optimize
+    :param templates: characters of the templates to apply, in order, among b, c, d and e
+    :return: new circuit
+    """
+    return Circuit(list(optimize_stream(circuit.all_operations(), templates)))
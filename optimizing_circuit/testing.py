@@ -0,0 +1,288 @@
+import numpy as np
+from cirq import (CCX, CCZ, CNOT, CSWAP, CZ, ISWAP, SWAP, XX, ZZ, Circuit, H, LineQubit, PhasedXPowGate, S, T, X,
+                  XPowGate, YPowGate, Z, ZPowGate, allclose_up_to_global_phase, final_state_vector, measure, rx, ry,
+                  rz)
+
+from .batchVerify import batch_equivalent
+from .circuitIO import circuit_from_qasm, circuit_to_qasm
+from .compactCircuit import apply_compact
+from .customGate import CXX, CXXX, CXn
+from .incremental import IncrementalOptimizer
+from .randomCircuit import generate_random_circuit
+from .transformer import TRANSFORMERS
+
+
+# gates of the circuits of property_test besides H and CNOT: gates on one to four qubits, and powers of H and CNOT
+# which the transformers must not take for H and CNOT
+PROPERTY_GATES = [X, Z, S, T, H ** 0.5, CZ, SWAP, ISWAP, XX, ZZ, CNOT ** 0.5, CCZ, CCX, CSWAP, CXX(), CXXX(), CXn(4)]
+
+
+# simple test: show that all transformer work exactly like the identities
+def simple_test(template, cost_model=None):
+    """
+    :param template: a character to point the template to test correctness
+    :param cost_model: optional costModel.CostModel, the optimization is then judged by its cost instead of the
+    number of gates
+    """
+    num_qb = 0
+    cir_depth = 0
+    match template:
+        case 'a':
+            num_qb = 4
+            cir_depth = 9
+        case 'b':
+            num_qb = 1
+            cir_depth = 2
+        case 'c':
+            num_qb = 2
+            cir_depth = 2
+        case 'd':
+            num_qb = 3
+            cir_depth = 2
+        case 'e':
+            num_qb = 2
+            cir_depth = 1
+        case 'f':
+            num_qb = 2
+            cir_depth = 5
+        case _:
+            print("Undefined template. Choose template a, b, c, d, e, f")
+    print("\nTesting template", template)
+    qubits = [LineQubit(i) for i in range(num_qb)]
+    origin = generate_random_circuit(qubits, cir_depth, template)
+    print("Origin circuit:\n", origin)
+
+    opt = TRANSFORMERS[template](origin)
+    print("Optimized circuit:\n", opt)
+
+    # Compare the circuit depths
+    depth1 = len(list(origin.all_operations()))
+    depth2 = len(list(opt.all_operations()))
+    print(f"Origin Circuit Depth: {depth1}")
+    print(f"Optimized Circuit Depth: {depth2}")
+
+    if cost_model is not None:
+        report = cost_model.report(origin, opt)
+        print(f"Estimated duration: {report['duration_before']:.0f} ns -> {report['duration_after']:.0f} ns")
+        print(f"Estimated fidelity: {report['fidelity_before']:.4f} -> {report['fidelity_after']:.4f}")
+        if cost_model.cost(opt) < cost_model.cost(origin):
+            print("Optimizer successfully reduced circuit cost.")
+        else:
+            print("Optimizer did not reduce circuit cost.")
+        return
+
+    # Check if the optimized circuit is correct
+    if depth2 < depth1:
+        print("Optimizer successfully reduced circuit depth.")
+    else:
+        print("Optimizer did not reduce circuit depth.")
+
+    return
+
+
+def simulator_test(origin, opt):
+    # the simulator and matplotlib are only needed to plot the histograms
+    import matplotlib.pyplot as plt
+    from cirq import Simulator, plot_state_histogram
+
+    # measure copies of the circuits so that the caller's circuits are not modified
+    origin = origin + Circuit(measure(qubit, key=str(qubit)) for qubit in origin.all_qubits())
+    opt = opt + Circuit(measure(qubit, key=str(qubit)) for qubit in opt.all_qubits())
+
+    simulator = Simulator()
+    origin_result = simulator.run(origin, repetitions=1000)
+    opt_result = simulator.run(opt, repetitions=1000)
+
+    fig, ax = plt.subplots()  # Create a figure and axis object
+    _ = plot_state_histogram(origin_result, ax, title="origin circuit")  # Use the axis object to plot the histogram
+    plt.savefig("origin")  # Save the figure
+
+    fig, ax = plt.subplots()  # Create a new figure and axis object for the next histogram
+    _ = plot_state_histogram(opt_result, ax, title="optimized circuit")  # Use the axis object to plot the histogram
+    plt.savefig("opt")
+
+    return
+
+
+def assert_equivalent(origin, opt, max_unitary_qubits=8, num_states=3, atol=1e-6, seed=None):
+    """
+    Check that two circuits implement the same operation up to global phase. Small circuits compare their full
+    unitaries, larger ones compare the output of both circuits on a few random input states. The circuits are not
+    modified
+    :param origin: the original circuit
+    :param opt: the optimized circuit
+    :param max_unitary_qubits: largest number of qubits for which the full unitaries are compared
+    :param num_states: number of random input states for larger circuits
+    :param atol: absolute tolerance
+    :param seed: seed of the random input states
+    """
+    qubits = sorted(origin.all_qubits() | opt.all_qubits())
+    if len(qubits) <= max_unitary_qubits:
+        origin_unitary = origin.unitary(qubit_order=qubits)
+        opt_unitary = opt.unitary(qubit_order=qubits)
+        if not allclose_up_to_global_phase(origin_unitary, opt_unitary, atol=atol):
+            raise AssertionError("The unitaries of the circuits differ")
+        return
+
+    rng = np.random.default_rng(seed)
+    dim = 2 ** len(qubits)
+    global_phase = None
+    for _ in range(num_states):
+        state = rng.normal(size=dim) + 1j * rng.normal(size=dim)
+        state /= np.linalg.norm(state)
+        origin_state = final_state_vector(origin, initial_state=state, qubit_order=qubits, dtype=np.complex128)
+        opt_state = final_state_vector(opt, initial_state=state, qubit_order=qubits, dtype=np.complex128)
+        # both outputs must be equal up to the same phase for every input state
+        overlap = np.vdot(origin_state, opt_state)
+        if abs(abs(overlap) - 1) > atol:
+            raise AssertionError("The circuits give different states on a random input state")
+        if global_phase is None:
+            global_phase = overlap
+        elif abs(overlap - global_phase) > atol:
+            raise AssertionError("The circuits differ by a relative phase between input states")
+
+
+def _property_circuit(rng, num_qubits, depth):
+    # random circuit where half of the gates are H or CNOT so that the templates match, with now and then the H
+    # sandwiched CNOT fan-in of template a
+    qubits = LineQubit.range(num_qubits)
+    operations = []
+    while len(operations) < depth:
+        draw = rng.random()
+        if draw < 0.05 and num_qubits >= 4:
+            target, *controls = (qubits[i] for i in rng.choice(num_qubits, size=4, replace=False))
+            operations.extend([H(control) for control in controls] + [CNOT(control, target) for control in controls]
+                              + [H(control) for control in controls])
+            continue
+        if draw < 0.3:
+            gate = H
+        elif draw < 0.55:
+            gate = CNOT
+        else:
+            gate = PROPERTY_GATES[rng.integers(len(PROPERTY_GATES))]
+            if gate.num_qubits() > num_qubits:
+                continue
+        operations.append(gate.on(*(qubits[i] for i in rng.choice(num_qubits, size=gate.num_qubits(),
+                                                                   replace=False))))
+    return Circuit(operations)
+
+
+def property_test(templates='abcdef', num_circuits=200, max_qubits=6, max_depth=40, seed=0, compact=False):
+    """
+    Check that the transformers keep random circuits equivalent, on circuits mixing H and CNOT gates with gates on up
+    to five qubits and powers of H and CNOT. Circuit i is drawn from the seed [seed, i], so a failure is reproduced
+    with _property_circuit(np.random.default_rng([seed, i]), num_qubits, depth)
+    :param templates: characters of the transformers to check
+    :param num_circuits: number of random circuits per transformer
+    :param max_qubits: largest number of qubits of the circuits
+    :param max_depth: largest number of gates of the circuits
+    :param seed: seed of the circuits
+    :param compact: check the transformers of compactCircuit instead
+    :return: list of the failures, tuples (template, circuit index, origin circuit, optimized circuit)
+    """
+    runs = []
+    for i in range(num_circuits):
+        rng = np.random.default_rng([seed, i])
+        origin = _property_circuit(rng, int(rng.integers(2, max_qubits + 1)), int(rng.integers(1, max_depth + 1)))
+        for template in templates:
+            opt = apply_compact(origin, template) if compact else TRANSFORMERS[template](origin)
+            runs.append((template, i, origin, opt))
+    # all the pairs are checked at once
+    equivalent = batch_equivalent([(origin, opt) for _, _, origin, opt in runs], seed=seed)
+    failures = [run for run, ok in zip(runs, equivalent) if not ok]
+    print(f"{num_circuits} circuits per template, {len(failures)} failures")
+    return failures
+
+
+def qasm_round_trip_test(num_circuits=100, max_qubits=4, max_depth=20, seed=0):
+    """
+    Check that circuits with parametrized gates read back from their QASM text are equivalent to the originals. cirq
+    writes some of these gates as u3 with spaces between the angles
+    :param num_circuits: number of random circuits
+    :param max_qubits: largest number of qubits of the circuits
+    :param max_depth: largest number of gates of the circuits
+    :param seed: seed of the circuits
+    :return: list of the failures, tuples (circuit index, origin circuit, circuit read back)
+    """
+    rng = np.random.default_rng(seed)
+    gates = [lambda a, b: rx(np.pi * a), lambda a, b: ry(np.pi * a), lambda a, b: rz(np.pi * a),
+             lambda a, b: XPowGate(exponent=a), lambda a, b: YPowGate(exponent=a), lambda a, b: ZPowGate(exponent=a),
+             lambda a, b: PhasedXPowGate(phase_exponent=b, exponent=a)]
+    pairs = []
+    for _ in range(num_circuits):
+        qubits = LineQubit.range(int(rng.integers(1, max_qubits + 1)))
+        operations = []
+        for _ in range(int(rng.integers(1, max_depth + 1))):
+            if len(qubits) >= 2 and rng.random() < 0.3:
+                control, target = rng.choice(len(qubits), size=2, replace=False)
+                operations.append(CNOT(qubits[control], qubits[target]))
+            else:
+                gate = gates[rng.integers(len(gates))](*rng.uniform(-1, 1, size=2))
+                operations.append(gate.on(qubits[rng.integers(len(qubits))]))
+        origin = Circuit(operations)
+        pairs.append((origin, circuit_from_qasm(circuit_to_qasm(origin, qubits))))
+    equivalent = batch_equivalent(pairs, seed=seed)
+    failures = [(i, *pair) for i, (pair, ok) in enumerate(zip(pairs, equivalent)) if not ok]
+    print(f"{num_circuits} circuits, {len(failures)} failures")
+    return failures
+
+
+def incremental_test(num_circuits=50, num_edits=30, max_qubits=5, max_depth=30, templates='abcdf', seed=0):
+    """
+    Check that IncrementalOptimizer keeps random circuits equivalent under random edits: after each insertion,
+    deletion or replacement, the optimized circuit must be equivalent to the circuit before the edit with the edit
+    applied
+    :param num_circuits: number of random circuits
+    :param num_edits: number of edits per circuit
+    :param max_qubits: largest number of qubits of the circuits
+    :param max_depth: largest number of gates of the starting circuits
+    :param templates: characters of the templates given to IncrementalOptimizer
+    :param seed: seed of the circuits and the edits
+    :return: list of the failures, tuples (circuit index, edit index, expected circuit, optimized circuit)
+    """
+    failures = []
+    for i in range(num_circuits):
+        rng = np.random.default_rng([seed, i])
+        num_qubits = int(rng.integers(2, max_qubits + 1))
+        optimizer = IncrementalOptimizer(_property_circuit(rng, num_qubits, int(rng.integers(1, max_depth + 1))),
+                                         templates)
+        for edit in range(num_edits):
+            nodes = optimizer.nodes()
+            operations = [node.op for node in nodes]
+            # a random operation, mostly H or CNOT so that the templates match around it
+            op = next(_property_circuit(rng, num_qubits, 1).all_operations())
+            draw = rng.random()
+            if not nodes or draw < 0.2:
+                optimizer.insert(op)
+                operations.append(op)
+            elif draw < 0.5:
+                k = int(rng.integers(len(nodes)))
+                optimizer.insert(op, nodes[k])
+                operations.insert(k + 1, op)
+            elif draw < 0.75:
+                k = int(rng.integers(len(nodes)))
+                optimizer.delete(nodes[k])
+                del operations[k]
+            else:
+                k = int(rng.integers(len(nodes)))
+                optimizer.replace(nodes[k], op)
+                operations[k] = op
+            expected = Circuit(operations)
+            opt = optimizer.circuit()
+            try:
+                assert_equivalent(expected, opt, seed=seed)
+            except AssertionError:
+                failures.append((i, edit, expected, opt))
+                break
+    print(f"{num_circuits} circuits with {num_edits} edits each, {len(failures)} failures")
+    return failures
+
+
+def custom_gate_repr_test():
+    """
+    Check that the repr of the custom gates evaluates back to an equal gate, following the cirq convention
+    """
+    import cirq.testing
+    import optimizing_circuit
+    for gate in (CXX(), CXXX(), CXn(1), CXn(5)):
+        cirq.testing.assert_equivalent_repr(gate, global_vals={'optimizing_circuit': optimizing_circuit})
@@ -0,0 +1,448 @@
+from cirq import (CCZPowGate, CNOT, CXPowGate, CZPowGate, Circuit, H, XPowGate, XXPowGate, ZPowGate,
+                  ZZPowGate)
+from .customGate import CXX, CXn, fan_out
+from .instrumentation import instrumented
+
+
+def _pauli_roles(op):
+    # per qubit of the operation: 'Z' when the gate acts on it diagonally, 'X' when it acts on it with X-type
+    # rotations, None when neither
+    gate = op.gate
+    if isinstance(gate, (ZPowGate, CZPowGate, ZZPowGate, CCZPowGate)):
+        return ('Z',) * len(op.qubits)
+    if isinstance(gate, (XPowGate, XXPowGate)):
+        return ('X',) * len(op.qubits)
+    if isinstance(gate, CXPowGate):
+        return 'Z', 'X'
+    if isinstance(gate, CXn):
+        return ('Z',) + ('X',) * gate.num_targets
+    return (None,) * len(op.qubits)
+
+
+class _PendingCnots:
+    """
+    CNOT gates waiting for a partner, in the order they were met, indexed by the qubits they act on and their role on
+    each qubit, so that finding the CNOTs on a qubit does not scan all pending gates.
+    When used with flush_blocking, the pending CNOTs commute with each other and with every operation added to the
+    circuit after them, so any of them can be moved to the end of the circuit, and the pending CNOTs on a qubit all
+    have the same role on it
+    """
+
+    def __init__(self):
+        # tuple (control, target) -> CNOT operation
+        self.gates = {}
+        # qubit -> keys of the pending CNOTs with this qubit as control, or as target, dictionaries used as ordered sets
+        self.by_control = {}
+        self.by_target = {}
+        # largest number of CNOTs pending at once
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self.gates)
+
+    def __contains__(self, key):
+        return key in self.gates
+
+    def on(self, qubit):
+        """
+        :return: keys (control, target) of the pending CNOTs acting on the qubit, oldest first for each role
+        """
+        return list(self.by_control.get(qubit, ())) + list(self.by_target.get(qubit, ()))
+
+    def with_control(self, qubit):
+        """
+        :return: iterable of the keys (control, target) of the pending CNOTs with the qubit as control, oldest first
+        """
+        return self.by_control.get(qubit, ())
+
+    def add(self, op):
+        key = (op.qubits[0], op.qubits[1])
+        self.gates[key] = op
+        self.by_control.setdefault(key[0], {})[key] = None
+        self.by_target.setdefault(key[1], {})[key] = None
+        if len(self.gates) > self.high_water:
+            self.high_water = len(self.gates)
+
+    def pop(self, key):
+        del self.by_control[key[0]][key]
+        del self.by_target[key[1]][key]
+        return self.gates.pop(key)
+
+    def flush(self, qubit, circuit):
+        # add the pending CNOTs acting on the qubit to the circuit
+        for key in self.on(qubit):
+            circuit.append(self.pop(key))
+
+    def flush_blocking(self, op, circuit):
+        # add to the circuit the pending CNOTs which do not commute with the operation. Diagonal gates commute with a
+        # CNOT on its control and X-type gates on its target, so the CNOTs with a commuting role are not looked at
+        for qubit, role in zip(op.qubits, _pauli_roles(op)):
+            if role != 'Z':
+                for key in list(self.by_control.get(qubit, ())):
+                    circuit.append(self.pop(key))
+            if role != 'X':
+                for key in list(self.by_target.get(qubit, ())):
+                    circuit.append(self.pop(key))
+
+    def flush_all(self, circuit):
+        for key in list(self.gates):
+            circuit.append(self.pop(key))
+
+
+def _flipped_cnot(op):
+    q0, q1 = op.qubits
+    return [H(q0), H(q1), CNOT(q1, q0), H(q1), H(q0)]
+
+
+def _neighbours(ops):
+    # index of the previous and next operation on each qubit of each operation
+    prev_on = [{} for _ in ops]
+    next_on = [{} for _ in ops]
+    last = {}
+    for i, op in enumerate(ops):
+        for qubit in op.qubits:
+            j = last.get(qubit)
+            prev_on[i][qubit] = j
+            if j is not None:
+                next_on[j][qubit] = i
+            last[qubit] = i
+    return prev_on, next_on
+
+
+def _topological_order(ops, groups):
+    # nodes in an order keeping the order of the operations on each qubit, where node i < len(ops) is the operation i
+    # and node len(ops) + g stands for all the operations of groups[g], and the successors of each node. A group which
+    # is not convex, with a path leaving it and coming back, never becomes ready: it is left out of the order with all
+    # the nodes after it
+    node_of = list(range(len(ops)))
+    for g, members in enumerate(groups):
+        for i in members:
+            node_of[i] = len(ops) + g
+    successors = [[] for _ in range(len(ops) + len(groups))]
+    in_degree = [0] * len(successors)
+    last = {}
+    for i, op in enumerate(ops):
+        node = node_of[i]
+        for qubit in op.qubits:
+            prev = last.get(qubit)
+            if prev != node:
+                if prev is not None:
+                    successors[prev].append(node)
+                    in_degree[node] += 1
+                last[qubit] = node
+
+    order = [node for node in dict.fromkeys(node_of) if in_degree[node] == 0]
+    for node in order:
+        for successor in successors[node]:
+            in_degree[successor] -= 1
+            if in_degree[successor] == 0:
+                order.append(successor)
+    return order, successors
+
+
+def _nodes_on_cycles(successors, nodes):
+    # nodes of the strongly connected components of more than one node among the given nodes, with Tarjan's algorithm
+    # run without recursion
+    nodes = set(nodes)
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    cyclic = set()
+    for root in nodes:
+        if root in index:
+            continue
+        # (node, position of the next successor to visit)
+        work = [(root, 0)]
+        while work:
+            node, position = work.pop()
+            if position == 0:
+                index[node] = low[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            descended = False
+            while position < len(successors[node]):
+                successor = successors[node][position]
+                position += 1
+                if successor not in nodes:
+                    continue
+                if successor not in index:
+                    work.append((node, position))
+                    work.append((successor, 0))
+                    descended = True
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            if descended:
+                continue
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1:
+                    cyclic.update(component)
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return cyclic
+
+
+@instrumented('a')
+def merge_flip_cnot(circuit, stats=None):
+    """
+    Apply the template a: k >= 2 CNOT gates one after the other on a target, each with H gates around its control,
+    transform to one fan-out gate from the target to the controls with H gates around the target. The fan-ins are
+    found in one pass over the operations linked to their neighbours on each qubit, so they match in whatever order
+    the operations of independent qubits come, and each one is replaced in one step
+    :param circuit: a circuit to optimize
+    :param stats: optional dictionary filled with the number of matches
+    :return: new circuit
+    """
+    ops = list(circuit.all_operations())
+    prev_on, next_on = _neighbours(ops)
+    used = [False] * len(ops)
+    # (target, controls, indices of the H and CNOT gates) of each fan-in
+    fan_ins = []
+    for i, op in enumerate(ops):
+        if op.gate != CNOT or used[i]:
+            continue
+        target = op.qubits[1]
+        controls = []
+        members = []
+        j = i
+        # follow the CNOT gates on the target while their controls are distinct and sandwiched by H gates
+        while j is not None and not used[j] and ops[j].gate == CNOT and ops[j].qubits[1] == target:
+            control = ops[j].qubits[0]
+            sandwich = (prev_on[j][control], next_on[j].get(control))
+            # an H gate already merged with another fan-in cannot be shared
+            if control in controls or not all(h is not None and not used[h] and ops[h].gate == H for h in sandwich):
+                break
+            controls.append(control)
+            members.extend((sandwich[0], j, sandwich[1]))
+            j = next_on[j].get(target)
+        if len(controls) >= 2:
+            for index in members:
+                used[index] = True
+            fan_ins.append((target, controls, members))
+
+    while True:
+        order, successors = _topological_order(ops, [members for _, _, members in fan_ins])
+        if len(order) == used.count(False) + len(fan_ins):
+            break
+        # only the fan-ins on a cycle keep their gates, the ones merely after them in the order are fine
+        emitted = set(order)
+        stuck = _nodes_on_cycles(successors, (node for node in range(len(successors)) if node not in emitted))
+        for g, (_, _, members) in enumerate(fan_ins):
+            if len(ops) + g in stuck:
+                for index in members:
+                    used[index] = False
+        fan_ins = [fan_in for g, fan_in in enumerate(fan_ins) if len(ops) + g not in stuck]
+
+    new_ops = []
+    for node in order:
+        if node < len(ops):
+            new_ops.append(ops[node])
+        else:
+            target, controls, _ = fan_ins[node - len(ops)]
+            new_ops.extend([H(target), fan_out(len(controls)).on(target, *controls), H(target)])
+    if stats is not None:
+        stats.update(matches=len(fan_ins))
+    return Circuit(new_ops)
+
+
+@instrumented('b')
+def cancel_adj_h(circuit, stats=None):
+    """
+    Apply the template b: a sequence of two Hadamard gate is cancelled
+    :param circuit: a circuit to optimize
+    :param stats: optional dictionary filled with the number of matches and the pending high-water mark
+    :return: new circuit
+    """
+    matches = 0
+    pending = 0
+    high_water = 0
+    opt_circuit = Circuit()
+    # dictionary to keep track H gates on individual qubits in circuit
+    hadamard_gates = {qubit: None for qubit in circuit.all_qubits()}
+    for moment in circuit:
+        for op in moment:
+            if op.gate == H:
+                qubit = op.qubits[0]
+                if hadamard_gates[qubit] is not None:
+                    # if the qubit already has a H gate, cancel the sequence by setting the previous
+                    # Hadamard gate to None
+                    hadamard_gates[qubit] = None
+                    matches += 1
+                    pending -= 1
+                else:
+                    # store the current H gate
+                    hadamard_gates[qubit] = op
+                    pending += 1
+                    high_water = max(high_water, pending)
+            else:
+                # if current operation is not H, the previous H on each of its qubits (if existed) should be added
+                for qubit in op.qubits:
+                    prev_hadamard_op = hadamard_gates[qubit]
+                    if prev_hadamard_op is not None:
+                        opt_circuit.append(prev_hadamard_op)
+                        hadamard_gates[qubit] = None
+                        pending -= 1
+                # add the current operation
+                opt_circuit.append(op)
+
+    # add any remaining H gates in the dictionary to the optimized circuit
+    for qubit, hadamard_op in hadamard_gates.items():
+        if hadamard_op is not None:
+            opt_circuit.append(hadamard_op)
+    if stats is not None:
+        stats.update(matches=matches, pending_high_water=high_water)
+
+    return opt_circuit
+
+
+@instrumented('c')
+def cancel_adj_cnot(circuit, stats=None):
+    """
+    Apply the template c: a sequence of two CNOT gates is cancelled, also when the gates between them commute with
+    the CNOT
+    :param circuit: a circuit to optimize
+    :param stats: optional dictionary filled with the number of matches and the pending high-water mark
+    :return: new circuit
+    """
+    matches = 0
+    opt_circuit = Circuit()
+    # pending CNOT gates, commuting with each other and with the operations added after them
+    cnot_gates = _PendingCnots()
+    for moment in circuit:
+        for op in moment:
+            if op.gate == CNOT:
+                control = op.qubits[0]
+                target = op.qubits[1]
+                if (control, target) in cnot_gates:
+                    cnot_gates.pop((control, target))
+                    matches += 1
+                    continue  # Skip adding the current CNOT gate
+                else:
+                    # flush the CNOT gates which do not commute with the current one and store the current one
+                    cnot_gates.flush_blocking(op, opt_circuit)
+                    cnot_gates.add(op)
+            else:
+                cnot_gates.flush_blocking(op, opt_circuit)
+                # add the current operation
+                opt_circuit.append(op)
+
+    # add any remaining CNOT gates to the optimized circuit
+    cnot_gates.flush_all(opt_circuit)
+    if stats is not None:
+        stats.update(matches=matches, pending_high_water=cnot_gates.high_water)
+
+    return opt_circuit
+
+
+@instrumented('d')
+def two_cx_to_cxx(circuit, stats=None):
+    """
+        Apply the template d: a sequence of two CNOT gates that share the same control qubit transforms to CXX gate,
+        also when the gates between them commute with the CNOT gates
+        :param circuit: a circuit to optimize
+        :param stats: optional dictionary filled with the number of matches and the pending high-water mark
+        :return: new circuit
+        """
+    matches = 0
+    opt_circuit = Circuit()
+    # pending CNOT gates, commuting with each other and with the operations added after them
+    cnot_gates = _PendingCnots()
+    for moment in circuit:
+        for op in moment:
+            if op.gate == CNOT:
+                control = op.qubits[0]
+                target = op.qubits[1]
+                fan_out = next((key for key in cnot_gates.with_control(control) if key[1] != target), None)
+                if fan_out is not None:
+                    pre_target = fan_out[1]
+                    cnot_gates.pop(fan_out)
+                    cnot_gates.flush_blocking(op, opt_circuit)
+                    opt_circuit.append(CXX().on(control, pre_target, target))
+                    matches += 1
+                    continue  # Skip adding the current CNOT gate
+                else:
+                    # flush the CNOT gates which do not commute with the current one and store the current one
+                    if (control, target) in cnot_gates:
+                        opt_circuit.append(cnot_gates.pop((control, target)))
+                    cnot_gates.flush_blocking(op, opt_circuit)
+                    cnot_gates.add(op)
+            else:
+                cnot_gates.flush_blocking(op, opt_circuit)
+                # add the current operation
+                opt_circuit.append(op)
+
+    # add any remaining CNOT gates to the optimized circuit
+    cnot_gates.flush_all(opt_circuit)
+    if stats is not None:
+        stats.update(matches=matches, pending_high_water=cnot_gates.high_water)
+
+    return opt_circuit
+
+
+@instrumented('e')
+def flip_cnot(circuit, stats=None):
+    """
+    Apply template e. Flip a cnot gate and add surrounding H gates on the qubit the CX gate applied
+    :param circuit
+    :param stats: optional dictionary filled with the number of matches
+    :return:
+    """
+    matches = 0
+    opt_circuit = Circuit()
+    for moment in circuit:
+        new_ops = []
+        for op in moment:
+            if op.gate == CNOT:
+                new_ops.extend(_flipped_cnot(op))
+                matches += 1
+            else:
+                new_ops.append(op)
+        opt_circuit.append(new_ops)
+    if stats is not None:
+        stats.update(matches=matches)
+    return opt_circuit
+
+
+@instrumented('f')
+def reverse_cnot_with_hgate(circuit, stats=None):
+    """
+    Apply template f. When both control and target qubits of a CX gate sandwiched by Hadamard gates, we can delete
+    sandwiched the H gates and flip CX gate to optimize. All the sandwiches are found in one pass over the operations
+    linked to their neighbours on each qubit, and the circuit keeps the order of the original operations
+    :param circuit
+    :param stats: optional dictionary filled with the number of matches
+    :return: new optimized circuit
+    """
+    ops = list(circuit.all_operations())
+    prev_on, next_on = _neighbours(ops)
+
+    removed = [False] * len(ops)
+    flipped = {}
+    for i, op in enumerate(ops):
+        if op.gate != CNOT:
+            continue
+        control, target = op.qubits
+        sandwich = [prev_on[i][control], prev_on[i][target], next_on[i].get(control), next_on[i].get(target)]
+        # an H gate already deleted with another CNOT gate cannot be shared
+        if all(j is not None and not removed[j] and ops[j].gate == H for j in sandwich):
+            for j in sandwich:
+                removed[j] = True
+            flipped[i] = CNOT(target, control)
+
+    if stats is not None:
+        stats.update(matches=len(flipped))
+    return Circuit([flipped.get(i, op) for i, op in enumerate(ops) if not removed[i]])
+
+
+# transformer of each template, by template character
+TRANSFORMERS = {'a': merge_flip_cnot, 'b': cancel_adj_h, 'c': cancel_adj_cnot, 'd': two_cx_to_cxx,
+                'e': flip_cnot, 'f': reverse_cnot_with_hgate}